@@ -0,0 +1,115 @@
+"""Micro-benchmark for the audio effects.
+
+Times each filter on batches of 20 ms stereo frames and reports frames
+per second and how many real-time streams one core could carry. The
+baseline rows are PCMVolumeTransformer's per-frame volume and a
+YTDLSource with no effects, which should match it. Requires NumPy.
+
+    python -m benchmarks.dsp --batch 1,5,10
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+import discord
+
+from utils.dsp import Biquad, Volume, Limiter, FilterChain, PRESETS, CHANNELS, SAMPLE_RATE
+from config.config import DSP_BATCH_FRAMES
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+
+def make_pcm(seconds):
+    """Music-like test signal: a bass note, a melody and some noise"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    mono = 9000 * np.sin(2 * math.pi * 55 * t) + 6000 * np.sin(2 * math.pi * 660 * t) + rng.normal(0, 1500, t.size)
+    return np.stack([mono, mono * 0.9], axis=1).clip(-32768, 32767).astype(np.int16).tobytes()
+
+class MemorySource(discord.AudioSource):
+    """Serves frames from memory, looping, like a read-ahead buffer that is always full"""
+
+    def __init__(self, pcm):
+        self.pcm = pcm
+        self.offset = 0
+
+    def read(self):
+        return self.read_frames(1)
+
+    def read_frames(self, max_frames):
+        size = max_frames * FRAME_SIZE
+        if self.offset + size > len(self.pcm):
+            self.offset = 0
+        data = self.pcm[self.offset:self.offset + size]
+        self.offset += size
+        return data
+
+def time_frames(step, frames_per_step, budget):
+    """Run step() until budget seconds pass and return frames per second"""
+    done = 0
+    start = time.perf_counter()
+    while True:
+        step()
+        done += frames_per_step
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return done / elapsed
+
+def float_step(band, batch, pcm):
+    x = np.frombuffer(pcm[:batch * FRAME_SIZE], dtype=np.int16).reshape(-1, CHANNELS).T.astype(np.float32, order='C')
+    return lambda: band.process(x.copy())
+
+def ramping_volume():
+    volume = Volume(0.5)
+    original = volume.process
+
+    def process(x):
+        # Keep it ramping between two levels
+        if not volume.ramping:
+            volume.target = 1.0 if volume.gain < 1.0 else 0.5
+        return original(x)
+    volume.process = process
+    return volume
+
+def source_cases(pcm):
+    """Sources as the player reads them, one frame per read()"""
+    from utils.youtube_handler import YTDLSource
+
+    yield 'PCMVolumeTransformer', 1, discord.PCMVolumeTransformer(MemorySource(pcm), 0.5).read
+    yield 'YTDLSource, no effects', 1, YTDLSource(MemorySource(pcm), data={}, volume=0.5).read
+    yield 'YTDLSource, bassboost', DSP_BATCH_FRAMES, YTDLSource(MemorySource(pcm), data={}, volume=0.5, preset='bassboost').read
+
+def filter_cases(batch, pcm):
+    """Single filters and whole chains on one batch at a time"""
+    yield 'volume ramp', float_step(ramping_volume(), batch, pcm)
+    yield 'biquad (lowshelf)', float_step(Biquad('lowshelf', 80, 10.0, 0.7), batch, pcm)
+    yield 'biquad (peaking)', float_step(Biquad('peaking', 2500, 4.0, 1.0), batch, pcm)
+    yield 'limiter', float_step(Limiter(), batch, pcm)
+    for preset in PRESETS:
+        chain = FilterChain(0.5, preset)
+        data = pcm[:batch * FRAME_SIZE]
+        yield f"chain: {preset}", lambda chain=chain, data=data: chain.process(data)
+
+def report(name, batch, fps):
+    print(f"{name:<26} {batch:>5} {fps:>12,.0f} {fps / 50:>13,.0f}")
+
+def main(args):
+    pcm = make_pcm(10)
+    print(f"{'filter':<26} {'batch':>5} {'frames/s':>12} {'streams/core':>13}")
+    for name, batch, read in source_cases(pcm):
+        report(name, batch, time_frames(read, 1, args.seconds))
+    for batch in (int(size) for size in args.batch.split(',')):
+        print()
+        for name, step in filter_cases(batch, pcm):
+            report(name, batch, time_frames(step, batch, args.seconds))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', default='1,5,10', help='comma separated frames per batch')
+    parser.add_argument('--seconds', type=float, default=0.5, help='time spent on each case')
+    args = parser.parse_args()
+    main(args)
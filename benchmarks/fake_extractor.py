@@ -0,0 +1,53 @@
+import hashlib
+import re
+import time
+
+def fake_worker_main(conn, latency, search_latency, media_url, codec, tail_fraction=0.0, tail_latency=0.0, warmup=None):
+    """Extraction worker stand-in: answer every job after a fixed latency.
+
+    A tail_fraction of YouTube videos (picked by ID, so repeatable) take
+    tail_latency instead, like YouTube on a bad day.
+    """
+    conn.send(('ready', None, None))
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+
+        url, download, options = job[:3]
+        if options.get('extract_flat'):
+            # Flat search: one candidate named after the query
+            query = url.split(':', 1)[1]
+            video_id = fake_id(query)
+            time.sleep(search_latency)
+            entry = {'id': video_id, 'title': query, 'duration': 3, 'channel': 'Benchmark Artist'}
+            conn.send(('ok', {'entries': [entry]}, None))
+            continue
+
+        match = re.search(r'v=([\w-]{11})', url)
+        video_id = match.group(1) if match else fake_id(url)
+        slow = match and int(video_id, 16) % 1000 < tail_fraction * 1000
+        time.sleep(tail_latency if slow else latency)
+        conn.send(('ok', fake_info(video_id, f"video {video_id}", media_url, codec), None))
+
+def fake_id(query):
+    return hashlib.sha1(query.encode()).hexdigest()[:11]
+
+def fake_info(video_id, title, media_url, codec):
+    """Info dict shaped like yt-dlp's for a locally served media file"""
+    opus = codec == 'opus'
+    return {
+        'id': video_id,
+        'title': title,
+        'url': media_url,
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'duration': 3,
+        'thumbnail': None,
+        'format_id': '251' if opus else 'wav',
+        'acodec': 'opus' if opus else 'pcm_s16le',
+        'ext': 'webm' if opus else 'wav',
+        'extractor_key': 'Youtube'
+    }
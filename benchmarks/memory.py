@@ -0,0 +1,168 @@
+"""Memory benchmark for the gateway modes.
+
+Feeds synthetic GUILD_CREATE payloads through discord.py's connection
+state, shaped like the gateway sends them for each mode's intents, and
+reports resident memory per 1,000 guilds. Presence updates, which only
+the full mode subscribes to, are parsed afterwards to show their CPU cost.
+Each mode runs in its own process so the numbers do not mix.
+
+    python -m benchmarks.memory --guilds 1000 --members 200
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+BOT_ID = 1
+MEMBER_ID_BASE = 10 ** 15
+TIMESTAMP = '2024-01-01T00:00:00+00:00'
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        # Peak rather than current outside Linux; kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def user(user_id):
+    return {'id': str(user_id), 'username': f"user{user_id}", 'global_name': None, 'discriminator': '0', 'avatar': None}
+
+def member(user_id):
+    return {'user': user(user_id), 'roles': [], 'joined_at': TIMESTAMP, 'deaf': False, 'mute': False, 'flags': 0}
+
+def guild_payload(guild_index, args, intents):
+    """A GUILD_CREATE payload as the gateway would send it for these intents"""
+    guild_id = (guild_index + 1) * 10 ** 6
+    member_ids = [MEMBER_ID_BASE + guild_index * args.members + i for i in range(args.members)]
+    voice_channel = str(guild_id + 100)
+    voice_ids = member_ids[:args.voice_members]
+
+    channels = [{'id': str(guild_id + 1 + i), 'type': 0, 'name': f"text-{i}", 'position': i, 'permission_overwrites': []}
+                for i in range(args.channels)]
+    channels.append({'id': voice_channel, 'type': 2, 'name': 'music', 'position': 0, 'permission_overwrites': [],
+                     'bitrate': 64000, 'user_limit': 0})
+
+    voice_states = [{
+        'user_id': str(user_id), 'channel_id': voice_channel, 'session_id': f"s{user_id}",
+        'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': False,
+        'self_video': False, 'suppress': False, 'request_to_speak_timestamp': None,
+        'member': member(user_id)
+    } for user_id in voice_ids]
+
+    # Without the members intent only the bot and members in voice are sent
+    sent_members = member_ids if intents.members else voice_ids
+    payload = {
+        'id': str(guild_id),
+        'name': f"guild {guild_index}",
+        'owner_id': str(member_ids[0]),
+        'member_count': args.members,
+        'large': args.members > 250,
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0,
+                   'hoist': False, 'managed': False, 'mentionable': False}],
+        'emojis': [],
+        'stickers': [],
+        'features': [],
+        'channels': channels,
+        'threads': [],
+        'voice_states': voice_states,
+        'members': [member(BOT_ID)] + [member(user_id) for user_id in sent_members],
+        'presences': []
+    }
+    if intents.presences:
+        online = member_ids[:int(args.members * args.online)]
+        payload['presences'] = [presence(user_id, guild_id) for user_id in online]
+    return payload
+
+def presence(user_id, guild_id):
+    return {
+        'user': {'id': str(user_id)},
+        'guild_id': str(guild_id),
+        'status': 'online',
+        'activities': [{'name': 'Spotify', 'type': 2, 'created_at': 0}],
+        'client_status': {'desktop': 'online'}
+    }
+
+async def measure(mode, args):
+    """Load the guilds into a client built with the mode's options"""
+    import discord
+    from utils.gateway import client_options
+
+    options = client_options(mode)
+    client = discord.Client(**options)
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data=user(BOT_ID))
+    intents = options['intents']
+
+    gc.collect()
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    for guild_index in range(args.guilds):
+        state._get_create_guild(guild_payload(guild_index, args, intents))
+    load_time = time.perf_counter() - start
+    gc.collect()
+    loaded = rss_bytes()
+
+    # Presence updates are only delivered with the presences intent
+    updates = 0
+    start = time.perf_counter()
+    if intents.presences:
+        for guild_index in range(args.guilds):
+            guild_id = (guild_index + 1) * 10 ** 6
+            for i in range(args.presence_updates):
+                user_id = MEMBER_ID_BASE + guild_index * args.members + i % args.members
+                state.parse_presence_update(presence(user_id, guild_id))
+                updates += 1
+    presence_time = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'guilds': args.guilds,
+        'members_cached': sum(len(guild._members) for guild in state._guilds.values()),
+        'rss_per_1000': (loaded - baseline) / args.guilds * 1000,
+        'load_time': load_time,
+        'presence_updates': updates,
+        'presence_time': presence_time
+    }
+
+def run_child(mode, args):
+    """Run one mode in a fresh interpreter and return its results"""
+    command = [sys.executable, '-m', 'benchmarks.memory', '--child', mode]
+    for name in ('guilds', 'members', 'voice_members', 'channels', 'online', 'presence_updates'):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def report(results):
+    print(f"\n{'mode':<6} {'guilds':>7} {'members cached':>15} {'RSS / 1000 guilds':>18} {'load (s)':>9} {'presence updates':>17} {'parse (s)':>10}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['guilds']:>7} {result['members_cached']:>15} "
+              f"{result['rss_per_1000'] / 1024 ** 2:>15.1f} MB {result['load_time']:>9.2f} "
+              f"{result['presence_updates']:>17} {result['presence_time']:>10.2f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='full,lean', help='comma separated gateway modes to compare')
+    parser.add_argument('--guilds', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=200, help='members per guild')
+    parser.add_argument('--voice-members', type=int, default=3, help='members in a voice channel per guild')
+    parser.add_argument('--channels', type=int, default=20, help='text channels per guild')
+    parser.add_argument('--online', type=float, default=0.3, help='share of members online (full mode presences)')
+    parser.add_argument('--presence-updates', type=int, default=50, help='presence updates parsed per guild')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.child, args))))
+    else:
+        report([run_child(mode, args) for mode in args.modes.split(',')])
@@ -0,0 +1,253 @@
+"""Offline benchmark for the play flow.
+
+Drives the bot's play command against local stand-ins: a fake yt-dlp
+extractor with configurable latency, a stub Spotify Web API, a media file
+served over local HTTP and voice clients that consume frames at Discord's
+pace. Reports time-to-first-audio, the gap between tracks, event-loop lag
+and CPU per stream for 1, 10 and 100 simulated guilds. With --hiccups
+ffmpeg processes are paused at random, like a slow -reconnect, and
+playback stutters are counted. With --repeat --broadcast every guild
+plays the same songs from one shared ffmpeg per track.
+
+Requires ffmpeg on PATH. Run from the repository root:
+
+    python -m benchmarks.run --guilds 1,10,100 --latency 2 --source youtube
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.stubs import StubServer, FakeVoiceClient, GuildStats, FakeGuild, FakeContext, write_media
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    """Record how late the event loop wakes a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+def signal_process(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+async def pause_ffmpeg(args, stop, interval=0.1):
+    """Freeze random ffmpeg processes for a moment, as a stalled network read would"""
+    from utils.ffmpeg_supervisor import ffmpeg_supervisor
+
+    while args.hiccups and not stop.is_set():
+        await asyncio.sleep(interval)
+        for managed in list(ffmpeg_supervisor.processes.values()):
+            if random.random() < args.hiccups / 60 * interval:
+                signal_process(managed.process.pid, signal.SIGSTOP)
+                asyncio.get_running_loop().call_later(
+                    args.hiccup_seconds, signal_process, managed.process.pid, signal.SIGCONT)
+
+def make_queries(args, run, guild_index):
+    if args.source == 'playlist':
+        return [f"https://open.spotify.com/playlist/r{run}g{guild_index}"]
+    if args.source == 'spotify':
+        return [f"https://open.spotify.com/track/r{run}g{guild_index}t{track}" for track in range(args.tracks)]
+    if args.repeat:
+        # Every guild asks for the same songs, like a trending track
+        return [f"benchmark song {track}" for track in range(args.tracks)]
+    return [f"benchmark song r{run} g{guild_index} t{track}" for track in range(args.tracks)]
+
+async def run_guilds(bot_module, args, run, guild_count):
+    """Simulate guild_count guilds each running the play command"""
+    from utils.music_player import players
+
+    guilds = []
+    for guild_index in range(guild_count):
+        stats = GuildStats(args.tracks)
+        voice_client = FakeVoiceClient(stats)
+        guild = FakeGuild(run * 100000 + guild_index, voice_client)
+        guilds.append((guild, stats, make_queries(args, run, guild_index)))
+
+    async def drive(guild, stats, queries):
+        ctx = FakeContext(guild)
+        stats.command_time = time.perf_counter()
+        for query in queries:
+            await bot_module.play.callback(ctx, query=query)
+
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.get_running_loop().create_task(monitor_loop_lag(lag_samples, stop))
+    hiccups = asyncio.get_running_loop().create_task(pause_ffmpeg(args, stop))
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+
+    await asyncio.gather(*(drive(*guild) for guild in guilds))
+    deadline = time.monotonic() + args.timeout
+    while not all(stats.done.is_set() for _, stats, _ in guilds) and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+    for guild, _, _ in guilds:
+        player = players.get(guild.id)
+        if player:
+            await player.destroy()
+        guild.voice_client.stop()
+    await asyncio.sleep(0.2)
+
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+    stop.set()
+    await monitor
+    await hiccups
+
+    ttfa = [stats.time_to_first_audio() for _, stats, _ in guilds if stats.starts]
+    gaps = [gap for _, stats, _ in guilds for gap in stats.gaps()]
+    finished = sum(1 for _, stats, _ in guilds if stats.done.is_set())
+    return {
+        'guilds': guild_count,
+        'finished': finished,
+        'ttfa': ttfa,
+        'gaps': gaps,
+        'lag': lag_samples,
+        'cpu_per_stream': cpu / wall / guild_count * 100,
+        'stutters': sum(stats.stutters for _, stats, _ in guilds),
+        'stutter_time': sum(stats.stutter_time for _, stats, _ in guilds)
+    }
+
+def report(result):
+    ms = lambda value: f"{value * 1000:8.1f}"
+    print(f"\n== {result['guilds']} guild(s), {result['finished']} finished ==")
+    print(f"time to first audio (ms)  p50 {ms(percentile(result['ttfa'], 50))}  p95 {ms(percentile(result['ttfa'], 95))}  max {ms(max(result['ttfa'], default=float('nan')))}")
+    print(f"inter-track gap (ms)      p50 {ms(percentile(result['gaps'], 50))}  p95 {ms(percentile(result['gaps'], 95))}  max {ms(max(result['gaps'], default=float('nan')))}")
+    print(f"event loop lag (ms)       p50 {ms(percentile(result['lag'], 50))}  p95 {ms(percentile(result['lag'], 95))}  p99 {ms(percentile(result['lag'], 99))}")
+    print(f"CPU per stream            {result['cpu_per_stream']:.2f}% of one core")
+    print(f"stutters                  {result['stutters']} ({result['stutter_time']:.2f}s of late audio)")
+
+async def main(args):
+    media_dir = tempfile.mkdtemp(prefix='musicbot-bench-')
+    write_media(media_dir, seconds=args.media_seconds)
+    server = StubServer(media_dir, spotify_latency=args.spotify_latency, playlist_size=args.playlist_size)
+    base_url = await server.start()
+
+    # Configure the bot for the stand-ins before any of its modules load
+    os.environ.setdefault('DISCORD_TOKEN', 'benchmark-token-not-used')
+    os.environ['SPOTIFY_CLIENT_ID'] = 'benchmark'
+    os.environ['SPOTIFY_CLIENT_SECRET'] = 'benchmark'
+    os.environ['SPOTIFY_API_URL'] = f"{base_url}/v1"
+    os.environ['SPOTIFY_TOKEN_URL'] = f"{base_url}/token"
+    os.environ['TRACK_INDEX_PATH'] = os.path.join(media_dir, 'track_index.db')
+    os.environ['AUDIO_CACHE_DIR'] = os.path.join(media_dir, 'audio_cache')
+    os.environ['PLAYBACK_MODE'] = args.mode
+    if not args.audio_cache:
+        os.environ['AUDIO_CACHE_MAX_BYTES'] = '0'
+    if args.hedge:
+        os.environ['HEDGE_ENABLED'] = 'true'
+    os.environ['FFMPEG_MAX_PROCESSES'] = str(args.ffmpeg_max)
+    if args.no_buffer:
+        os.environ['AUDIO_BUFFER_MAX_SECONDS'] = '0'
+    if args.broadcast:
+        os.environ['BROADCAST_ENABLED'] = 'true'
+    os.environ['LOUDNESS_DB_PATH'] = os.path.join(media_dir, 'loudness.db')
+
+    import src.music_bot as bot_module
+    # Per-process ffmpeg log lines would drown the report
+    logging.getLogger('discord').setLevel(logging.WARNING)
+    logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+    import utils.youtube_handler as youtube_handler
+    from utils.extraction_pool import ExtractionPool
+    from utils.ffmpeg_supervisor import ffmpeg_supervisor
+    from utils.audio_buffer import buffer_stats
+    from utils.audio_cache import audio_cache
+    from utils.broadcast import broadcast_hub
+    from benchmarks.fake_extractor import fake_worker_main
+
+    media_url = f"{base_url}/media/{'media.webm' if args.codec == 'opus' else 'media.wav'}"
+    youtube_handler.extraction_pool = ExtractionPool(
+        size=args.workers,
+        target=fake_worker_main,
+        target_args=(args.latency, args.search_latency, media_url, args.codec, args.tail_fraction, args.tail_latency)
+    )
+
+    # Give the unconnected bot a loop and mark it ready
+    await bot_module.bot._async_setup_hook()
+    bot_module.bot._ready.set()
+
+    # Pay for worker start-up before measuring
+    pool = youtube_handler.extraction_pool
+    await asyncio.gather(*(pool.extract(f"warmup {i}", {}) for i in range(args.workers)))
+
+    try:
+        for run, guild_count in enumerate(int(count) for count in args.guilds.split(',')):
+            report(await run_guilds(bot_module, args, run, guild_count))
+            print(f"extractions               {youtube_handler.extraction_flight.stats()}")
+            print(f"resolution cache          {youtube_handler.resolution_cache.stats()}")
+            print(f"search cache              {youtube_handler.search_cache.stats()}")
+            print(f"extraction pool           {youtube_handler.extraction_pool.stats()}")
+            if args.audio_cache:
+                print(f"audio cache               {audio_cache.stats()}")
+            if not args.no_buffer:
+                print(f"audio buffer              {buffer_stats.stats()}")
+            ffmpeg = ffmpeg_supervisor.stats()
+            print(f"ffmpeg                    {ffmpeg['spawned']} spawned, peak {ffmpeg['peak']} of {ffmpeg['max'] or 'unlimited'}, "
+                  f"{ffmpeg['queued']} waited for a slot, {ffmpeg['running']} still running")
+            if args.broadcast:
+                broadcast = broadcast_hub.stats()
+                print(f"broadcast                 {broadcast['started']} started, {broadcast['joined']} joined")
+            if youtube_handler.HEDGE_ENABLED:
+                hedge = youtube_handler.search_hedge.stats()
+                print(f"hedging                   {hedge['hedged']} of {hedge['requests']} hedged ({hedge['skipped']} skipped), {hedge['secondary_wins']} won by the secondary")
+    finally:
+        youtube_handler.extraction_pool.stop()
+        if bot_module.spotify_handler.sp:
+            await bot_module.spotify_handler.sp.close()
+        await server.stop()
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guilds', default='1,10,100', help='comma separated guild counts to simulate')
+    parser.add_argument('--tracks', type=int, default=2, help='tracks each guild plays')
+    parser.add_argument('--source', choices=['youtube', 'spotify', 'playlist'], default='youtube')
+    parser.add_argument('--latency', type=float, default=1.0, help='fake extraction latency in seconds')
+    parser.add_argument('--search-latency', type=float, default=0.3, help='fake flat search latency in seconds')
+    parser.add_argument('--tail-fraction', type=float, default=0.0, help='share of videos that extract slowly')
+    parser.add_argument('--tail-latency', type=float, default=8.0, help='fake extraction latency of the slow videos')
+    parser.add_argument('--spotify-latency', type=float, default=0.05, help='stub Spotify API latency in seconds')
+    parser.add_argument('--playlist-size', type=int, default=300)
+    parser.add_argument('--codec', choices=['pcm', 'opus'], default='pcm', help='codec of the served media file')
+    parser.add_argument('--mode', choices=['pcm', 'opus'], default='opus', help='PLAYBACK_MODE for the bot')
+    parser.add_argument('--workers', type=int, default=4, help='extraction workers')
+    parser.add_argument('--repeat', action='store_true', help='every guild requests the same songs')
+    parser.add_argument('--hedge', action='store_true', help='enable hedged resolution')
+    parser.add_argument('--audio-cache', action='store_true', help='enable the on-disk audio cache')
+    parser.add_argument('--ffmpeg-max', type=int, default=0, help='FFMPEG_MAX_PROCESSES for the bot (0 for no cap)')
+    parser.add_argument('--media-seconds', type=int, default=3, help='length of the served media file')
+    parser.add_argument('--hiccups', type=float, default=0.0, help='ffmpeg stalls per stream per minute')
+    parser.add_argument('--hiccup-seconds', type=float, default=0.8, help='length of each ffmpeg stall')
+    parser.add_argument('--broadcast', action='store_true', help='share one ffmpeg per track across guilds (use with --repeat)')
+    parser.add_argument('--no-buffer', action='store_true', help='play ffmpeg output without the read-ahead buffer')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for each run')
+    args = parser.parse_args()
+
+    if not shutil.which('ffmpeg'):
+        print("Error: ffmpeg was not found on PATH")
+        sys.exit(1)
+    asyncio.run(main(args))
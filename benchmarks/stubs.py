@@ -0,0 +1,241 @@
+import asyncio
+import math
+import os
+import struct
+import subprocess
+import threading
+import time
+import wave
+from aiohttp import web
+
+FRAME_DURATION = 0.02
+
+def write_media(directory, seconds=3):
+    """Write a stereo 48 kHz sine WAV and an Opus/WebM copy of it"""
+    wav_path = os.path.join(directory, 'media.wav')
+    with wave.open(wav_path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(48000)
+        samples = bytearray()
+        for i in range(48000 * seconds):
+            value = int(8000 * math.sin(2 * math.pi * 440 * i / 48000))
+            samples += struct.pack('<hh', value, value)
+        f.writeframes(bytes(samples))
+
+    webm_path = os.path.join(directory, 'media.webm')
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-i', wav_path, '-c:a', 'libopus', '-b:a', '128k', webm_path],
+        check=True
+    )
+    return wav_path, webm_path
+
+class StubServer:
+    """Local HTTP server for the media files and a Spotify Web API stand-in"""
+
+    def __init__(self, media_dir, spotify_latency=0.05, playlist_size=300):
+        self.media_dir = media_dir
+        self.spotify_latency = spotify_latency
+        self.playlist_size = playlist_size
+        self.runner = None
+        self.base_url = None
+        self.requests = 0
+        self.token_requests = 0
+        # (status, headers) answered to the next API requests, in order, before any real response
+        self.failures = []
+
+    def track(self, track_id):
+        return {
+            'id': track_id,
+            'name': f"Track {track_id}",
+            'duration_ms': 3000,
+            'artists': [{'name': 'Benchmark Artist'}],
+            'album': {'name': 'Benchmark Album', 'images': []}
+        }
+
+    async def token(self, request):
+        self.token_requests += 1
+        return web.json_response({'access_token': f"token-{self.token_requests}", 'token_type': 'Bearer', 'expires_in': 3600})
+
+    @web.middleware
+    async def inject_failures(self, request, handler):
+        """Answer queued failures to API requests, e.g. a 429 with Retry-After"""
+        if request.path.startswith('/v1/') and self.failures:
+            self.requests += 1
+            status, headers = self.failures.pop(0)
+            return web.json_response({'error': {'status': status, 'message': 'injected'}}, status=status, headers=headers)
+        return await handler(request)
+
+    async def get_track(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.spotify_latency)
+        return web.json_response(self.track(request.match_info['id']))
+
+    async def get_playlist(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.spotify_latency)
+        playlist_id = request.match_info['id']
+        items = [{'track': self.track(f"{playlist_id}x{i}")} for i in range(min(100, self.playlist_size))]
+        return web.json_response({'name': f"Playlist {playlist_id}", 'tracks': {'total': self.playlist_size, 'items': items}})
+
+    async def get_playlist_tracks(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.spotify_latency)
+        playlist_id = request.match_info['id']
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', 100))
+        items = [{'track': self.track(f"{playlist_id}x{i}")} for i in range(offset, min(self.playlist_size, offset + limit))]
+        return web.json_response({'items': items, 'total': self.playlist_size, 'offset': offset})
+
+    async def start(self):
+        app = web.Application(middlewares=[self.inject_failures])
+        app.router.add_post('/token', self.token)
+        app.router.add_get('/v1/tracks/{id}', self.get_track)
+        app.router.add_get('/v1/playlists/{id}', self.get_playlist)
+        app.router.add_get('/v1/playlists/{id}/tracks', self.get_playlist_tracks)
+        app.router.add_static('/media/', self.media_dir)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+class FakeVoiceClient:
+    """Voice client stand-in that pulls frames at Discord's 20 ms pace"""
+
+    def __init__(self, guild_stats):
+        self.stats = guild_stats
+        self.source = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.paused = False
+
+    def is_connected(self):
+        return True
+
+    def is_playing(self):
+        return self.thread is not None and self.thread.is_alive() and not self.paused
+
+    def is_paused(self):
+        return self.paused
+
+    def play(self, source, *, after=None):
+        self.source = source
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(source, after, self.stopped), daemon=True)
+        self.thread.start()
+
+    def _run(self, source, after, stopped):
+        first = True
+        next_time = time.perf_counter()
+        while not stopped.is_set():
+            data = source.read()
+            if not data:
+                break
+            now = time.perf_counter()
+            if first:
+                self.stats.track_started(now)
+                next_time = now
+                first = False
+            elif now - next_time > FRAME_DURATION:
+                # The frame came over a frame late: an audible stutter
+                self.stats.stutters += 1
+                self.stats.stutter_time += now - next_time
+                next_time = now
+            self.stats.frames += 1
+            next_time += FRAME_DURATION
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.stats.track_ended(time.perf_counter())
+        source.cleanup()
+        if after:
+            after(None)
+
+    def stop(self):
+        self.stopped.set()
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+
+class GuildStats:
+    """Timestamps collected by one simulated guild"""
+
+    def __init__(self, tracks_expected):
+        self.tracks_expected = tracks_expected
+        self.command_time = None
+        self.starts = []
+        self.ends = []
+        self.frames = 0
+        self.stutters = 0
+        self.stutter_time = 0.0
+        self.done = threading.Event()
+
+    def track_started(self, now):
+        self.starts.append(now)
+
+    def track_ended(self, now):
+        self.ends.append(now)
+        if len(self.ends) >= self.tracks_expected:
+            self.done.set()
+
+    def time_to_first_audio(self):
+        return self.starts[0] - self.command_time if self.starts else None
+
+    def gaps(self):
+        return [start - end for end, start in zip(self.ends, self.starts[1:])]
+
+class FakeMessage:
+    async def edit(self, *, content=None, embed=None):
+        return self
+
+class FakeChannel:
+    async def send(self, content=None, *, embed=None):
+        return FakeMessage()
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+class FakeVoiceState:
+    channel = None
+
+class FakeAuthor:
+    voice = FakeVoiceState()
+
+class FakeGuild:
+    def __init__(self, guild_id, voice_client):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.voice_client = voice_client
+
+class FakeContext:
+    """Just enough of commands.Context for the bot's commands"""
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.voice_client = guild.voice_client
+        self.channel = FakeChannel()
+        self.author = FakeAuthor()
+        self.message = self
+
+    async def send(self, content=None, *, embed=None):
+        return FakeMessage()
+
+    def typing(self):
+        return FakeTyping()
@@ -2,6 +2,13 @@ import os
 from pathlib import Path
 import platform
 
+def env_flag(name, default=False):
+    """Read a boolean setting; 1, true, yes and on (any case) count as true"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 # Get user's home directory
 HOME = str(Path.home())
 
@@ -46,7 +53,9 @@ YTDL_OPTIONS = {
     'default_search': 'ytsearch',
     'source_address': '0.0.0.0',
     'force-ipv4': True,
-    'cachedir': False,
+    # Deciphering functions for each player version are cached on disk and
+    # shared by the extraction workers
+    'cachedir': os.getenv('YTDL_CACHE_DIR', os.path.join(Path(__file__).parent.parent, 'data', 'yt-dlp-cache')),
     'extractor-args': {
         'youtube': {
             'player_skip': ['webpage', 'configs'],
@@ -55,7 +64,6 @@ YTDL_OPTIONS = {
     },
     'geo-bypass': True,
     'geo-bypass-country': 'US',
-    'cookies-from-browser': 'chrome',
     'nocheckcertificate': True,
     'no-check-certificates': True,
     'prefer-insecure': True,
@@ -75,4 +83,199 @@ SPOTIFY_PATTERNS = {
 }
 
 # Current OS
-CURRENT_OS = platform.system() 
\ No newline at end of file
+CURRENT_OS = platform.system()
+
+# Resolution cache settings; the size counts videos, each found by ID and by its queries
+RESOLVE_CACHE_SIZE = int(os.getenv('RESOLVE_CACHE_SIZE', '512'))
+# Seconds to keep entries whose stream URL has no expire= parameter
+RESOLVE_CACHE_TTL = int(os.getenv('RESOLVE_CACHE_TTL', '1800'))
+# Seconds before the signed stream URL expires to drop the entry
+RESOLVE_CACHE_EXPIRY_MARGIN = int(os.getenv('RESOLVE_CACHE_EXPIRY_MARGIN', '600'))
+# Search results (query -> candidate videos) kept, and for how many seconds
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '3600'))
+
+# Persistent Spotify track ID -> YouTube video ID index
+TRACK_INDEX_PATH = os.getenv('TRACK_INDEX_PATH', os.path.join(Path(__file__).parent.parent, 'data', 'track_index.db'))
+
+# Extraction worker pool settings
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Jobs allowed to wait for a worker before submitters are made to wait
+EXTRACTION_QUEUE_SIZE = int(os.getenv('EXTRACTION_QUEUE_SIZE', '64'))
+EXTRACTION_GUILD_QUEUE_SIZE = int(os.getenv('EXTRACTION_GUILD_QUEUE_SIZE', '4'))
+
+# Spotify Web API endpoints (overridable to point at a local stub server)
+SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
+SPOTIFY_TOKEN_URL = os.getenv('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
+SPOTIFY_MAX_CONNECTIONS = int(os.getenv('SPOTIFY_MAX_CONNECTIONS', '20'))
+SPOTIFY_MAX_RETRIES = int(os.getenv('SPOTIFY_MAX_RETRIES', '3'))
+# Playlist pages fetched at once when importing large playlists
+SPOTIFY_PAGE_CONCURRENCY = int(os.getenv('SPOTIFY_PAGE_CONCURRENCY', '5'))
+
+# Guild player settings
+# Entries a guild can have waiting; streamed playlists pause when it is full
+PLAYER_QUEUE_SIZE = int(os.getenv('PLAYER_QUEUE_SIZE', '100'))
+# How many queued tracks to resolve ahead of the one playing
+PLAYER_PREFETCH_TRACKS = int(os.getenv('PLAYER_PREFETCH_TRACKS', '2'))
+
+# Playback settings
+# 'opus' hands Opus streams to Discord without decoding them in Python,
+# 'pcm' always decodes through FFmpegPCMAudio and PCMVolumeTransformer
+PLAYBACK_MODE = os.getenv('PLAYBACK_MODE', 'opus')
+# Opus streams are only copied untouched at 1.0; any other volume makes
+# ffmpeg decode and re-encode them to apply it
+PLAYBACK_VOLUME = float(os.getenv('PLAYBACK_VOLUME', '1.0'))
+# Prefer Opus formats so the passthrough path can be used
+OPUS_FORMAT = 'bestaudio[acodec=opus]/bestaudio/best'
+OPUS_BITRATE = int(os.getenv('OPUS_BITRATE', '128'))
+
+# On-disk audio cache (set AUDIO_CACHE_MAX_BYTES=0 to disable)
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', os.path.join(Path(__file__).parent.parent, 'data', 'audio_cache'))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+# Longer tracks (mixes, hour-long loops) are streamed but never cached
+AUDIO_CACHE_MAX_DURATION = int(os.getenv('AUDIO_CACHE_MAX_DURATION', '900'))
+AUDIO_CACHE_FILL_WORKERS = int(os.getenv('AUDIO_CACHE_FILL_WORKERS', '2'))
+# Seconds between hit rate and bytes saved log lines (0 to disable)
+AUDIO_CACHE_REPORT_INTERVAL = float(os.getenv('AUDIO_CACHE_REPORT_INTERVAL', '600'))
+
+# Upstream protection for YouTube extraction
+# Token bucket: sustained extractions per second and burst size
+EXTRACTION_RATE = float(os.getenv('EXTRACTION_RATE', '5'))
+EXTRACTION_BURST = int(os.getenv('EXTRACTION_BURST', '10'))
+# Concurrency is adjusted between 1 and this based on throttling errors
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv('EXTRACTION_MAX_CONCURRENCY', str(EXTRACTION_WORKERS * 2)))
+EXTRACTION_RETRIES = int(os.getenv('EXTRACTION_RETRIES', '2'))
+# Consecutive upstream failures that open the circuit, and seconds it stays open
+EXTRACTION_BREAKER_THRESHOLD = int(os.getenv('EXTRACTION_BREAKER_THRESHOLD', '5'))
+EXTRACTION_BREAKER_RESET = float(os.getenv('EXTRACTION_BREAKER_RESET', '30'))
+
+# YouTube cookies
+# Netscape cookie file to use as is; when unset, cookies are exported once
+# from the first browser found in BROWSER_PATHS (or COOKIE_BROWSER)
+COOKIE_FILE = os.getenv('COOKIE_FILE')
+COOKIE_BROWSER = os.getenv('COOKIE_BROWSER')
+COOKIE_EXPORT_DIR = os.getenv('COOKIE_EXPORT_DIR', os.path.join(Path(__file__).parent.parent, 'data', 'cookies'))
+COOKIE_REFRESH_INTERVAL = int(os.getenv('COOKIE_REFRESH_INTERVAL', str(6 * 3600)))
+
+# Pooled YoutubeDL instances in each extraction worker
+# Jobs, consecutive failures and seconds after which an instance is rebuilt
+YTDL_MAX_USES = int(os.getenv('YTDL_MAX_USES', '500'))
+YTDL_MAX_ERRORS = int(os.getenv('YTDL_MAX_ERRORS', '5'))
+YTDL_MAX_AGE = int(os.getenv('YTDL_MAX_AGE', str(6 * 3600)))
+# Idle instances kept per worker (one per distinct set of options:
+# full extraction, flat search and the no-cookies fallback)
+YTDL_MAX_IDLE = int(os.getenv('YTDL_MAX_IDLE', '3'))
+# Video each worker extracts at start-up to load the player code (empty to skip)
+YTDL_WARMUP_URL = os.getenv('YTDL_WARMUP_URL', 'https://www.youtube.com/watch?v=jNQXAC9IVRw')
+
+# Candidates returned by the flat, metadata-only YouTube search
+YTDL_SEARCH_RESULTS = int(os.getenv('YTDL_SEARCH_RESULTS', '5'))
+
+# Spotify to YouTube matching
+# Seconds a candidate's length may differ from the Spotify track before it scores 0 on duration
+MATCH_DURATION_TOLERANCE = float(os.getenv('MATCH_DURATION_TOLERANCE', '30'))
+
+# Hedged resolution: when a YouTube resolve is slower than its recent
+# HEDGE_PERCENTILE latency, race the same query on HEDGE_BACKEND
+HEDGE_ENABLED = env_flag('HEDGE_ENABLED')
+# Any yt-dlp search prefix, e.g. scsearch for SoundCloud
+HEDGE_BACKEND = os.getenv('HEDGE_BACKEND', 'scsearch')
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '90'))
+# Delay used until HEDGE_MIN_SAMPLES latencies are known, and its bounds after that
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '3'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '1'))
+HEDGE_MAX_DELAY = float(os.getenv('HEDGE_MAX_DELAY', '8'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+# Recent requests kept per backend
+HEDGE_WINDOW = int(os.getenv('HEDGE_WINDOW', '500'))
+
+# Extraction deadlines in seconds; a worker past its deadline is killed and replaced
+EXTRACTION_SEARCH_TIMEOUT = float(os.getenv('EXTRACTION_SEARCH_TIMEOUT', '15'))
+EXTRACTION_EXTRACT_TIMEOUT = float(os.getenv('EXTRACTION_EXTRACT_TIMEOUT', '30'))
+EXTRACTION_DOWNLOAD_TIMEOUT = float(os.getenv('EXTRACTION_DOWNLOAD_TIMEOUT', '600'))
+# Time a new worker gets to import yt-dlp and run its warmup
+EXTRACTION_START_TIMEOUT = float(os.getenv('EXTRACTION_START_TIMEOUT', '60'))
+# Workers running one job for longer than this are reported as stuck
+EXTRACTION_STUCK_AFTER = float(os.getenv('EXTRACTION_STUCK_AFTER', '10'))
+
+# Cluster mode (python src/cluster.py)
+# Worker processes, each running a slice of the shards; defaults to one per core
+CLUSTER_PROCESSES = int(os.getenv('CLUSTER_PROCESSES', str(os.cpu_count() or 1)))
+# Total shards; 0 asks Discord for the recommended count
+CLUSTER_SHARDS = int(os.getenv('CLUSTER_SHARDS', '0'))
+CLUSTER_STATS_INTERVAL = float(os.getenv('CLUSTER_STATS_INTERVAL', '60'))
+# Set by the cluster launcher for each process it starts
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id]
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+
+# Gateway mode: 'lean' subscribes to guilds, voice states and messages only
+# and caches just the members in voice; 'full' keeps every intent and cache
+GATEWAY_MODE = os.getenv('GATEWAY_MODE', 'lean')
+# Messages kept in the client's message cache in lean mode
+GATEWAY_MAX_MESSAGES = int(os.getenv('GATEWAY_MAX_MESSAGES', '100'))
+
+# ffmpeg supervision
+# Cap on ffmpeg processes (playback, shared broadcasts and loudness analysis);
+# further spawns wait for a free slot (0 for no cap). src/cluster.py divides
+# it among its processes, so it holds for the whole host
+FFMPEG_MAX_PROCESSES = int(os.getenv('FFMPEG_MAX_PROCESSES', '100'))
+# Niceness ffmpeg runs at, so decoding yields the CPU to the bot's event loop
+FFMPEG_NICE = int(os.getenv('FFMPEG_NICE', '5'))
+# ionice scheduling class (1 realtime, 2 best-effort, 3 idle, 0 to leave as is) and best-effort level
+FFMPEG_IONICE_CLASS = int(os.getenv('FFMPEG_IONICE_CLASS', '2'))
+FFMPEG_IONICE_LEVEL = int(os.getenv('FFMPEG_IONICE_LEVEL', '7'))
+# Seconds between sweeps for exited and orphaned processes
+FFMPEG_REAP_INTERVAL = float(os.getenv('FFMPEG_REAP_INTERVAL', '30'))
+# Seconds between per-process CPU and memory reports (0 to disable)
+FFMPEG_REPORT_INTERVAL = float(os.getenv('FFMPEG_REPORT_INTERVAL', '600'))
+
+# Read-ahead buffer between ffmpeg and the voice send loop (PCM playback)
+# Seconds of audio read ahead at first; underruns double it up to the maximum,
+# which is allocated per stream (0 to read ffmpeg directly), and quiet spells
+# shrink it back to the minimum
+AUDIO_BUFFER_SECONDS = float(os.getenv('AUDIO_BUFFER_SECONDS', '2'))
+AUDIO_BUFFER_MIN_SECONDS = float(os.getenv('AUDIO_BUFFER_MIN_SECONDS', '1'))
+AUDIO_BUFFER_MAX_SECONDS = float(os.getenv('AUDIO_BUFFER_MAX_SECONDS', '6'))
+AUDIO_BUFFER_SHRINK_AFTER = float(os.getenv('AUDIO_BUFFER_SHRINK_AFTER', '30'))
+# Seconds buffered before playback resumes after an underrun
+AUDIO_BUFFER_RESUME_SECONDS = float(os.getenv('AUDIO_BUFFER_RESUME_SECONDS', '0.2'))
+
+# Audio effects (!eq, !volume); need NumPy and play through the PCM path
+# Frames filtered together when the read-ahead buffer has them
+DSP_BATCH_FRAMES = int(os.getenv('DSP_BATCH_FRAMES', '5'))
+# Seconds a volume change takes to go from silence to full volume
+VOLUME_RAMP_SECONDS = float(os.getenv('VOLUME_RAMP_SECONDS', '0.3'))
+# Peak level the limiter holds EQ output under, and how fast it lets go
+LIMITER_THRESHOLD_DB = float(os.getenv('LIMITER_THRESHOLD_DB', '-1'))
+LIMITER_RELEASE_SECONDS = float(os.getenv('LIMITER_RELEASE_SECONDS', '0.25'))
+
+# Loudness normalization: each video is measured once in the background from
+# its cached file and later plays get a static gain towards the target
+# (LOUDNESS_ENABLED=false to disable; needs the audio cache)
+LOUDNESS_ENABLED = env_flag('LOUDNESS_ENABLED', True)
+LOUDNESS_DB_PATH = os.getenv('LOUDNESS_DB_PATH', os.path.join(Path(__file__).parent.parent, 'data', 'loudness.db'))
+# Integrated loudness tracks are brought to, in LUFS
+LOUDNESS_TARGET = float(os.getenv('LOUDNESS_TARGET', '-14'))
+# Limits on the correction, in dB; boosts also stop where the true peak would pass the ceiling (dBFS)
+LOUDNESS_MAX_BOOST_DB = float(os.getenv('LOUDNESS_MAX_BOOST_DB', '6'))
+LOUDNESS_MAX_CUT_DB = float(os.getenv('LOUDNESS_MAX_CUT_DB', '15'))
+LOUDNESS_PEAK_CEILING = float(os.getenv('LOUDNESS_PEAK_CEILING', '-1'))
+# Corrections smaller than this many dB are skipped, keeping Opus stream copy
+LOUDNESS_TOLERANCE_DB = float(os.getenv('LOUDNESS_TOLERANCE_DB', '1'))
+# Analyses run at once, queued at most, and the longest track (seconds) worth analyzing
+LOUDNESS_WORKERS = int(os.getenv('LOUDNESS_WORKERS', '1'))
+LOUDNESS_MAX_PENDING = int(os.getenv('LOUDNESS_MAX_PENDING', '200'))
+LOUDNESS_MAX_DURATION = int(os.getenv('LOUDNESS_MAX_DURATION', '1800'))
+# Seconds before an analysis, or the cache fill it waits for, is given up
+LOUDNESS_TIMEOUT = float(os.getenv('LOUDNESS_TIMEOUT', '300'))
+# Seconds an analysis waits behind playback for an ffmpeg slot; after that
+# it is dropped and the video's next play queues it again
+LOUDNESS_SLOT_TIMEOUT = float(os.getenv('LOUDNESS_SLOT_TIMEOUT', '60'))
+
+# Broadcast fan-out: guilds playing the same track at the same volume share one
+# ffmpeg process and Opus encode (not used while a guild has an EQ preset)
+BROADCAST_ENABLED = env_flag('BROADCAST_ENABLED')
+# Seconds kept behind the furthest listener, so late joiners and slow players
+# can trail it, and read ahead of it
+BROADCAST_WINDOW_SECONDS = float(os.getenv('BROADCAST_WINDOW_SECONDS', '10'))
+BROADCAST_AHEAD_SECONDS = float(os.getenv('BROADCAST_AHEAD_SECONDS', '2'))
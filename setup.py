@@ -9,7 +9,13 @@ setup(
         'python-dotenv>=1.0.1',
         'yt-dlp>=2023.12.30',
         'spotipy>=2.23.0',
+        'aiohttp>=3.9.3',
         'PyNaCl>=1.5.0',
         'ffmpeg-python>=0.2.0',
     ],
+    extras_require={
+        # Audio effects (!eq) and the volume ramp
+        'effects': ['numpy>=1.21'],
+        'test': ['pytest>=7', 'numpy>=1.21'],
+    },
 ) 
\ No newline at end of file
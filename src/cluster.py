@@ -0,0 +1,222 @@
+"""Run the bot as a cluster of processes, each with a slice of the shards.
+
+Every process runs an AutoShardedBot for the shards i with
+i % CLUSTER_PROCESSES == its index, so it carries only those guilds'
+gateway events, commands and voice connections on its own interpreter.
+The launcher relays resolved tracks between processes and prints
+aggregated stats.
+
+    python src/cluster.py
+"""
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+
+# Add parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Settings each process gets a 1/N share of, so the cluster as a whole
+# keeps to the configured YouTube budget, worker count, cache size and ffmpeg cap
+DIVIDED_SETTINGS = ('EXTRACTION_WORKERS', 'EXTRACTION_RATE', 'EXTRACTION_BURST', 'EXTRACTION_MAX_CONCURRENCY',
+                    'AUDIO_CACHE_MAX_BYTES', 'FFMPEG_MAX_PROCESSES')
+# Directories each process gets a subdirectory of; their owners delete
+# files they did not write (partial downloads, older cookie exports)
+PRIVATE_DIRS = ('AUDIO_CACHE_DIR', 'COOKIE_EXPORT_DIR')
+# Seconds to wait before restarting a process that exited
+RESTART_DELAY = 5
+
+def recommended_shards(token):
+    """Ask Discord how many shards the bot should run"""
+    response = requests.get(
+        'https://discord.com/api/v10/gateway/bot',
+        headers={'Authorization': f"Bot {token}"},
+        timeout=10
+    )
+    response.raise_for_status()
+    return response.json()['shards']
+
+def run_process(conn, shard_ids, shard_count, overrides):
+    """Cluster process entry point: run the bot for a slice of the shards"""
+    # Config is read on import, so set the environment first
+    os.environ['SHARD_IDS'] = ','.join(str(shard_id) for shard_id in shard_ids)
+    os.environ['SHARD_COUNT'] = str(shard_count)
+    os.environ.update(overrides)
+
+    import src.music_bot as bot_module
+    from utils.cluster_ipc import ClusterLink
+
+    link = ClusterLink(conn, shard_ids)
+
+    async def setup_hook():
+        link.start(bot_module.bot)
+
+    bot_module.bot.setup_hook = setup_hook
+    bot_module.bot.run(bot_module.token)
+
+class Cluster:
+    """Starts the cluster processes, restarts them and relays their messages"""
+
+    def __init__(self, processes, shard_count, interval):
+        self.context = multiprocessing.get_context('spawn')
+        self.shard_count = shard_count
+        self.interval = interval
+        self.slices = [list(range(index, shard_count, processes)) for index in range(processes)]
+        divided = self._divided_settings(processes)
+        # A restarted process gets its predecessor's directories back
+        self.overrides = [dict(divided, **self._private_dirs(index)) for index in range(processes)]
+        # index -> (process, conn), or None while waiting to restart
+        self.members = [None] * processes
+        self.restart_at = {}
+        self.stats = {}
+
+    @staticmethod
+    def _divided_settings(processes):
+        import config.config as config
+
+        overrides = {}
+        for name in DIVIDED_SETTINGS:
+            value = getattr(config, name)
+            if not value:
+                # 0 disables the feature; keep it that way
+                overrides[name] = str(value)
+                continue
+            share = value / processes
+            overrides[name] = str(max(1, int(share)) if isinstance(value, int) else share)
+        return overrides
+
+    @staticmethod
+    def _private_dirs(index):
+        import config.config as config
+
+        return {name: os.path.join(getattr(config, name), f"process-{index}") for name in PRIVATE_DIRS}
+
+    def spawn(self, index):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=run_process,
+            args=(child_conn, self.slices[index], self.shard_count, self.overrides[index]),
+            name=f"cluster-{index}"
+        )
+        process.start()
+        child_conn.close()
+        self.members[index] = (process, conn)
+        print(f"Started cluster process {index} (pid {process.pid}) for shards {self.slices[index]}")
+
+    def broadcast(self, sender, message):
+        for index, member in enumerate(self.members):
+            if member and index != sender:
+                try:
+                    member[1].send(message)
+                except (OSError, ValueError):
+                    pass
+
+    def handle(self, index, message):
+        if message[0] == 'cache':
+            self.broadcast(index, message)
+        elif message[0] == 'stats':
+            self.stats[index] = message[2]
+
+    def report(self):
+        if not self.stats:
+            return
+        guilds = sum(stats['guilds'] for stats in self.stats.values())
+        players = sum(stats['players'] for stats in self.stats.values())
+        print(f"Cluster: {guilds} guilds, {players} players, {len(self.stats)}/{len(self.members)} processes reporting")
+        audio = [stats['audio_cache'] for stats in self.stats.values()]
+        hits, misses = sum(a['hits'] for a in audio), sum(a['misses'] for a in audio)
+        print(f"Audio cache: {sum(a['bytes'] for a in audio) / 1024 ** 2:.0f} MB, "
+              f"hit rate {hits / (hits + misses) if hits + misses else 0:.0%}, "
+              f"{sum(a['bytes_saved'] for a in audio) / 1024 ** 2:.0f} MB saved")
+        for index, stats in sorted(self.stats.items()):
+            cache = stats['resolution_cache']
+            audio = stats['audio_cache']
+            pool = stats['extraction_pool']
+            ffmpeg = stats['ffmpeg']
+            print(f"- process {index} shards {self.slices[index]}: {stats['guilds']} guilds, "
+                  f"{stats['players']} players, latency {stats['latency'] * 1000:.0f}ms, "
+                  f"cache hit rate {cache['hit_rate']:.0%}, shared {stats['shared']}/received {stats['received']}, "
+                  f"audio cache hit rate {audio['hit_rate']:.0%} ({audio['bytes_saved'] / 1024 ** 2:.0f} MB saved), "
+                  f"extraction timeouts {sum(pool['timeouts'].values())}, stuck {pool['stuck']}, "
+                  f"ffmpeg {ffmpeg['running']} running/{ffmpeg['waiting']} waiting "
+                  f"({ffmpeg['cpu']:.0%} CPU, {ffmpeg['rss'] / 1024 ** 2:.0f} MB)")
+
+    def run(self):
+        for index in range(len(self.members)):
+            self.spawn(index)
+
+        next_report = time.monotonic() + self.interval
+        while True:
+            readers = {}
+            for index, member in enumerate(self.members):
+                if member:
+                    readers[member[1]] = index
+                    readers[member[0].sentinel] = index
+
+            for ready in wait(list(readers), timeout=1):
+                index = readers[ready]
+                member = self.members[index]
+                if member is None:
+                    continue
+                process, conn = member
+                if ready is conn:
+                    try:
+                        self.handle(index, conn.recv())
+                        continue
+                    except (EOFError, OSError):
+                        pass
+                elif process.is_alive():
+                    continue
+
+                process.join(timeout=5)
+                conn.close()
+                print(f"Cluster process {index} exited with code {process.exitcode}, restarting in {RESTART_DELAY}s")
+                self.members[index] = None
+                self.stats.pop(index, None)
+                self.restart_at[index] = time.monotonic() + RESTART_DELAY
+
+            now = time.monotonic()
+            for index, restart_at in list(self.restart_at.items()):
+                if now >= restart_at:
+                    del self.restart_at[index]
+                    self.spawn(index)
+            if now >= next_report:
+                self.report()
+                next_report = now + self.interval
+
+    def stop(self):
+        for member in self.members:
+            if member:
+                member[0].terminate()
+        for member in self.members:
+            if member:
+                member[0].join(timeout=10)
+
+def main():
+    load_dotenv()
+    from config.config import CLUSTER_PROCESSES, CLUSTER_SHARDS, CLUSTER_STATS_INTERVAL
+
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        print("Error: No Discord token found in .env file!")
+        sys.exit(1)
+
+    shard_count = CLUSTER_SHARDS or recommended_shards(token)
+    processes = max(1, min(CLUSTER_PROCESSES, shard_count))
+    print(f"Starting cluster: {shard_count} shards across {processes} processes")
+
+    cluster = Cluster(processes, shard_count, CLUSTER_STATS_INTERVAL)
+    try:
+        cluster.run()
+    except KeyboardInterrupt:
+        print("Stopping cluster...")
+    finally:
+        cluster.stop()
+
+if __name__ == "__main__":
+    main()
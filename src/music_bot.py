@@ -0,0 +1,334 @@
+"""The bot and its commands; run it with src/bot.py or src/cluster.py"""
+from discord.ext import commands
+import os
+from dotenv import load_dotenv
+import logging
+import sys
+from pathlib import Path
+
+# Add parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.spotify_handler import SpotifyHandler
+from utils.music_player import get_player, players
+from utils.extraction_pool import extraction_pool
+from utils.cookie_manager import cookie_manager
+from utils.youtube_handler import YTDLSource
+from utils.gateway import client_options
+from utils.ffmpeg_supervisor import ffmpeg_supervisor
+from utils.audio_cache import audio_cache
+from utils.dsp import PRESETS, DSP_AVAILABLE
+from config.config import YTDL_WARMUP_URL, SHARD_IDS, SHARD_COUNT, PLAYBACK_VOLUME, PLAYBACK_MODE
+import asyncio
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('discord')
+logger.setLevel(logging.INFO)
+
+# Load environment variables
+print("Loading environment variables...")
+load_dotenv()
+
+# Get tokens
+token = os.getenv('DISCORD_TOKEN')
+SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
+SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+
+if not token:
+    print("Error: No Discord token found in .env file!")
+    exit(1)
+print(f"Discord token loaded: {token[:20]}...")
+
+# Initialize Spotify handler
+spotify_handler = SpotifyHandler(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET)
+
+# Initialize bot with the intents and caches of GATEWAY_MODE
+options = client_options()
+if SHARD_IDS:
+    # Started by src/cluster.py to run only these shards
+    bot = commands.AutoShardedBot(command_prefix='!', shard_ids=SHARD_IDS, shard_count=SHARD_COUNT, **options)
+else:
+    bot = commands.Bot(command_prefix='!', **options)
+
+close_bot = bot.close
+
+async def close():
+    # Close pooled HTTP sessions while the event loop is still running
+    await spotify_handler.close()
+    await close_bot()
+
+bot.close = close
+
+@bot.event
+async def on_ready():
+    print(f'{bot.user} has connected to Discord!')
+    # Spawn extraction workers now and have each load yt-dlp and the
+    # current YouTube player code, so the first !play does not pay for it
+    if not extraction_pool.workers:
+        extraction_pool.start(warmup=(YTDL_WARMUP_URL, await YTDLSource.build_options()))
+    # Export browser cookies once, then on a schedule
+    cookie_manager.start()
+    # Reap exited ffmpeg processes and those left behind by a lost voice connection
+    ffmpeg_supervisor.start(bot)
+    # Log the audio cache's hit rate and bytes saved now and then
+    audio_cache.start(bot)
+    print(f'Bot is in {len(bot.guilds)} guilds')
+    for guild in bot.guilds:
+        print(f'- {guild.name}')
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    # Disconnected from voice by a moderator or a dropped connection
+    if member.id != bot.user.id or after.channel is not None:
+        return
+    player = players.get(member.guild.id)
+    if player:
+        await player.destroy()
+    killed = ffmpeg_supervisor.kill_guild(member.guild.id)
+    if killed:
+        print(f"Killed {killed} ffmpeg process(es) after leaving voice in {member.guild.name}")
+
+@bot.command(name='play', help='تشغيل مقطع صوتي (رابط يوتيوب/سبوتيفاي أو بحث)')
+async def play(ctx, *, query):
+    try:
+        # Check if user is in voice channel
+        if not ctx.message.author.voice:
+            return await ctx.send("يجب أن تكون في قناة صوتية!")
+
+        # Join voice channel if not already in one
+        if not ctx.voice_client:
+            try:
+                await ctx.author.voice.channel.connect()
+                # Add a small delay to ensure connection is established
+                await asyncio.sleep(1)
+            except Exception as e:
+                return await ctx.send(f"❌ حدث خطأ أثناء الاتصال بالقناة الصوتية: {str(e)}")
+
+        # Verify voice connection
+        if not ctx.voice_client or not ctx.voice_client.is_connected():
+            return await ctx.send("❌ لم يتم الاتصال بالقناة الصوتية بشكل صحيح. الرجاء المحاولة مرة أخرى.")
+
+        player = get_player(bot, ctx.guild, ctx.channel)
+
+        async with ctx.typing():
+            try:
+                # Send initial status message
+                status_msg = await ctx.send("🔍 جاري البحث...")
+                
+                # Check if query is a Spotify URL
+                if 'open.spotify.com' in query:
+                    if 'track' in query:
+                        # Handle single Spotify track
+                        track_info, error_msg = await spotify_handler.get_track_info(query)
+                        if not track_info:
+                            await status_msg.edit(content=error_msg or "❌ حدث خطأ غير معروف")
+                            return
+                        
+                        entry = {
+                            'query': track_info['search_query'],
+                            'title': f"{track_info['artists']} - {track_info['track_name']}",
+                            'track_info': track_info
+                        }
+                        await enqueue(player, entry, status_msg, f"🎵 تم العثور على: {track_info['track_name']} - {track_info['artists']}\n⏳ جاري التحضير...")
+                        
+                    elif 'playlist' in query:
+                        # Handle Spotify playlist; tracks stream in page by page
+                        tracks = spotify_handler.get_playlist_tracks(query)
+                        try:
+                            first_track = await tracks.__anext__()
+                        except StopAsyncIteration:
+                            await status_msg.edit(content="❌ لم يتم العثور على قائمة التشغيل في Spotify. تأكد من صحة الرابط وأن القائمة متاحة.")
+                            return
+                        
+                        was_idle = player.is_idle()
+                        if was_idle:
+                            await status_msg.edit(content=f"📝 تم العثور على قائمة التشغيل: {first_track['playlist_name']}\n⏳ جاري تحضير المقطع الأول...")
+                        else:
+                            await status_msg.edit(content=f"📝 تمت إضافة {first_track['playlist_total']} مقطع من قائمة التشغيل {first_track['playlist_name']} إلى قائمة الانتظار")
+                        
+                        player.ingest(playlist_entries(first_track, tracks, status_msg if was_idle else None))
+                            
+                else:
+                    entry = {'query': query, 'title': query}
+                    if player.is_idle():
+                        # Plays next: the player's resolve searches and extracts
+                        # in one hedged step, so leave identifying to it
+                        await enqueue(player, entry, status_msg, f"🔍 جاري تحضير: {query}")
+                        return
+                    # Regular YouTube playback; a flat search names the video
+                    # now and its formats are only extracted when it is due
+                    if not await player.identify(entry):
+                        await status_msg.edit(content="❌ لم يتم العثور على نتائج")
+                        return
+                    await enqueue(player, entry, status_msg, f"🎵 تم العثور على: {entry['title']}\n⏳ جاري التحضير...")
+                
+            except Exception as e:
+                await status_msg.edit(content=f"❌ حدث خطأ: {str(e)}")
+                print(f"Error in play command: {str(e)}")
+
+    except Exception as e:
+        await ctx.send(f"❌ حدث خطأ: {str(e)}")
+        print(f"Error in play command: {str(e)}")
+
+async def enqueue(player, entry, status_msg, preparing_msg):
+    """Queue a single entry and update the command's status message"""
+    if player.is_idle():
+        await status_msg.edit(content=preparing_msg)
+        # The player turns this message into the now playing embed
+        entry['message'] = status_msg
+        player.add(entry)
+        return
+
+    try:
+        position = player.add(entry)
+    except asyncio.QueueFull:
+        return await status_msg.edit(content="❌ قائمة الانتظار ممتلئة، حاول مرة أخرى لاحقاً")
+    await status_msg.edit(content=f"✅ تمت الإضافة إلى قائمة الانتظار: **{entry['title']}** (#{position})")
+
+def playlist_entry(track, position):
+    """Build the queue entry for a Spotify playlist track"""
+    return {
+        'query': track['search_query'],
+        'title': f"{track['artists']} - {track['track_name']}",
+        'track_info': track,
+        'playlist_name': track['playlist_name'],
+        'position': position,
+        'total': track['playlist_total']
+    }
+
+async def playlist_entries(first_track, tracks, status_msg):
+    """Turn a streamed Spotify playlist into queue entries"""
+    try:
+        entry = playlist_entry(first_track, 1)
+        if status_msg:
+            # First track replaces the status message once it starts
+            entry['message'] = status_msg
+        yield entry
+
+        position = 1
+        async for track in tracks:
+            position += 1
+            yield playlist_entry(track, position)
+    finally:
+        await tracks.aclose()
+
+@bot.command(name='skip', help='تخطي المقطع الحالي')
+async def skip(ctx):
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+    
+    if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
+        # The player advances to the next track from the after callback
+        ctx.voice_client.stop()
+        await ctx.send("⏭️ تم التخطي")
+    else:
+        await ctx.send("❌ لا يوجد شيء قيد التشغيل!")
+
+@bot.command(name='queue', help='عرض قائمة الانتظار')
+async def queue(ctx):
+    player = players.get(ctx.guild.id)
+    if not player or player.is_idle():
+        return await ctx.send("📭 قائمة الانتظار فارغة")
+    
+    lines = []
+    if player.current:
+        lines.append(f"▶️ **{player.current[0]['title']}**")
+    pending = player.pending()
+    for position, entry in enumerate(pending[:10], start=1):
+        lines.append(f"{position}. {entry['title']}")
+    if len(pending) > 10:
+        lines.append(f"... و {len(pending) - 10} مقطع آخر")
+    await ctx.send("\n".join(lines))
+
+@bot.command(name='pause', help='إيقاف مؤقت')
+async def pause(ctx):
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+    
+    if ctx.voice_client.is_playing():
+        ctx.voice_client.pause()
+        await ctx.send("⏸️ تم الإيقاف المؤقت")
+    else:
+        await ctx.send("❌ لا يوجد شيء قيد التشغيل!")
+
+@bot.command(name='resume', help='استئناف التشغيل')
+async def resume(ctx):
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+    
+    if ctx.voice_client.is_paused():
+        ctx.voice_client.resume()
+        await ctx.send("▶️ تم استئناف التشغيل")
+    else:
+        await ctx.send("❌ لا يوجد شيء متوقف مؤقتاً!")
+
+@bot.command(name='stop', help='إيقاف التشغيل')
+async def stop(ctx):
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+    
+    player = players.get(ctx.guild.id)
+    if player:
+        player.clear()
+    
+    if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
+        ctx.voice_client.stop()
+        await ctx.send("⏹️ تم إيقاف التشغيل")
+    else:
+        await ctx.send("❌ لا يوجد شيء قيد التشغيل!")
+
+@bot.command(name='volume', help='تغيير مستوى الصوت (0-200)')
+async def volume(ctx, level: int = None):
+    player = players.get(ctx.guild.id)
+    if level is None:
+        current = player.volume if player else PLAYBACK_VOLUME
+        return await ctx.send(f"🔊 مستوى الصوت الحالي: {round(current * 100)}%")
+    if not 0 <= level <= 200:
+        return await ctx.send("❌ يجب أن يكون مستوى الصوت بين 0 و 200")
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+
+    player = get_player(bot, ctx.guild, ctx.channel)
+    if player.set_volume(level / 100):
+        message = f"🔊 تم تغيير مستوى الصوت إلى {level}%"
+    else:
+        message = f"🔊 سيتم تشغيل المقاطع التالية بمستوى صوت {level}%"
+    if PLAYBACK_MODE == 'opus' and level != 100:
+        # Opus streams are copied to Discord as is only at 100%
+        message += "\nℹ️ عند أي مستوى غير 100% يُعاد ترميز الصوت بدلاً من تمريره مباشرة، مما يستهلك معالجاً أكثر"
+    await ctx.send(message)
+
+@bot.command(name='eq', help=f"تطبيق مؤثرات صوتية ({', '.join(PRESETS)}, off)")
+async def eq(ctx, preset: str = None):
+    if not DSP_AVAILABLE:
+        return await ctx.send("❌ المؤثرات الصوتية غير متاحة لأن NumPy غير مثبت على الخادم. "
+                              "ثبّته بالأمر `pip install numpy` ثم أعد تشغيل البوت")
+    presets = ', '.join(PRESETS)
+    if preset is None:
+        player = players.get(ctx.guild.id)
+        current = player.preset if player and player.preset else 'off'
+        return await ctx.send(f"🎛️ المؤثر الحالي: {current}\nالمؤثرات المتاحة: {presets}, off")
+    preset = preset.lower()
+    if preset != 'off' and preset not in PRESETS:
+        return await ctx.send(f"❌ مؤثر غير معروف. المؤثرات المتاحة: {presets}, off")
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+
+    player = get_player(bot, ctx.guild, ctx.channel)
+    if player.set_preset(None if preset == 'off' else preset):
+        await ctx.send(f"🎛️ تم تطبيق المؤثر: {preset}")
+    else:
+        await ctx.send(f"🎛️ سيتم تطبيق المؤثر {preset} من المقطع التالي")
+
+@bot.command(name='leave', help='مغادرة القناة الصوتية')
+async def leave(ctx):
+    if not ctx.voice_client or not ctx.voice_client.is_connected():
+        return await ctx.send("❌ البوت غير متصل بأي قناة صوتية!")
+    
+    player = players.get(ctx.guild.id)
+    if player:
+        await player.destroy()
+    
+    await ctx.voice_client.disconnect()
+    await ctx.send("👋 تمت المغادرة") 
\ No newline at end of file
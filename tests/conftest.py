@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Import the bot's packages from the repository root
+sys.path.append(str(Path(__file__).parent.parent))
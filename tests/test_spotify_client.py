@@ -0,0 +1,86 @@
+import asyncio
+import time
+import pytest
+from benchmarks.stubs import StubServer
+from utils.spotify_client import AsyncSpotify, SpotifyError
+
+def run_against_stub(tmp_path, failures, body, **client_options):
+    """Run body(client, server) against a local stub Spotify API that first answers with failures"""
+    async def main():
+        server = StubServer(str(tmp_path), spotify_latency=0)
+        base_url = await server.start()
+        server.failures = list(failures)
+        client = AsyncSpotify('id', 'secret', api_url=f"{base_url}/v1", token_url=f"{base_url}/token",
+                              **client_options)
+        try:
+            return await body(client, server)
+        finally:
+            await client.close()
+            await server.stop()
+    return asyncio.run(main())
+
+def test_track(tmp_path):
+    async def body(client, server):
+        return await client.track('abc')
+
+    track = run_against_stub(tmp_path, [], body)
+    assert track['id'] == 'abc'
+    assert track['artists'][0]['name'] == 'Benchmark Artist'
+
+def test_rate_limit_waits_for_retry_after(tmp_path):
+    async def body(client, server):
+        start = time.monotonic()
+        track = await client.track('abc')
+        return track, time.monotonic() - start, server.requests
+
+    track, elapsed, requests = run_against_stub(tmp_path, [(429, {'Retry-After': '0.3'})], body)
+    assert track['id'] == 'abc'
+    assert requests == 2
+    assert elapsed >= 0.3
+
+def test_unauthorized_refreshes_token(tmp_path):
+    async def body(client, server):
+        await client.track('warm')
+        first_token = client.token
+        server.failures.append((401, {}))
+        track = await client.track('abc')
+        return track, first_token, client.token, server.token_requests
+
+    track, first_token, token, token_requests = run_against_stub(tmp_path, [], body)
+    assert track['id'] == 'abc'
+    assert token_requests == 2
+    assert token != first_token
+
+def test_server_errors_back_off(tmp_path):
+    async def body(client, server):
+        start = time.monotonic()
+        track = await client.track('abc')
+        return track, time.monotonic() - start, server.requests
+
+    failures = [(500, {}), (503, {})]
+    track, elapsed, requests = run_against_stub(tmp_path, failures, body, retry_backoff=0.1)
+    assert track['id'] == 'abc'
+    assert requests == 3
+    # 0.1s before the first retry, doubled to 0.2s before the second
+    assert elapsed >= 0.3
+
+def test_gives_up_after_max_retries(tmp_path):
+    async def body(client, server):
+        await client.track('abc')
+
+    failures = [(502, {})] * 3
+    with pytest.raises(SpotifyError) as error:
+        run_against_stub(tmp_path, failures, body, max_retries=2, retry_backoff=0.01)
+    assert error.value.http_status == 502
+
+def test_client_errors_are_not_retried(tmp_path):
+    async def body(client, server):
+        try:
+            await client.track('abc')
+        finally:
+            assert server.requests == 1
+
+    with pytest.raises(SpotifyError) as error:
+        run_against_stub(tmp_path, [(404, {})], body)
+    assert error.value.http_status == 404
+    assert error.value.msg == 'injected'
@@ -0,0 +1,196 @@
+import threading
+import time
+import discord
+from config.config import (
+    AUDIO_BUFFER_SECONDS, AUDIO_BUFFER_MIN_SECONDS, AUDIO_BUFFER_MAX_SECONDS, AUDIO_BUFFER_SHRINK_AFTER,
+    AUDIO_BUFFER_RESUME_SECONDS
+)
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+# Frames per second of audio; discord.py sends one every 20 ms
+FRAMES_PER_SECOND = 50
+
+class BufferStats:
+    """Totals across every buffered source on this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = 0
+        self.underruns = 0
+        # Times a reader topped the buffer out and waited; the normal steady state
+        self.full_waits = 0
+        self.stall_seconds = 0.0
+        self.grown = 0
+        self.shrunk = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def stats(self):
+        return {
+            'streams': self.streams,
+            'underruns': self.underruns,
+            'full_waits': self.full_waits,
+            'stall_seconds': self.stall_seconds,
+            'grown': self.grown,
+            'shrunk': self.shrunk
+        }
+
+class BufferedAudioSource(discord.AudioSource):
+    """Reads another PCM source ahead of playback into a ring buffer.
+
+    A reader thread pulls frames from the wrapped source (ffmpeg's stdout)
+    into a ring of AUDIO_BUFFER_MAX_SECONDS allocated up front, keeping
+    up to `depth` frames ahead of the player. A network hiccup then drains
+    the buffer instead of stalling the voice send loop.
+
+    Each underrun grows the depth, so a flaky stream plays in longer smooth
+    runs instead of stuttering frame by frame, and playback resumes once
+    AUDIO_BUFFER_RESUME_SECONDS are buffered again. After
+    AUDIO_BUFFER_SHRINK_AFTER seconds without one it shrinks back towards
+    AUDIO_BUFFER_MIN_SECONDS.
+    """
+
+    def __init__(self, original, *, seconds=AUDIO_BUFFER_SECONDS, min_seconds=AUDIO_BUFFER_MIN_SECONDS,
+                 max_seconds=AUDIO_BUFFER_MAX_SECONDS, shrink_after=AUDIO_BUFFER_SHRINK_AFTER,
+                 resume_seconds=AUDIO_BUFFER_RESUME_SECONDS):
+        self.original = original
+        self.capacity = max(1, int(max_seconds * FRAMES_PER_SECOND))
+        self.min_depth = max(1, min(self.capacity, int(min_seconds * FRAMES_PER_SECOND)))
+        self.depth = max(self.min_depth, min(self.capacity, int(seconds * FRAMES_PER_SECOND)))
+        self.shrink_after = shrink_after
+        self.resume_at = max(1, min(self.capacity, int(resume_seconds * FRAMES_PER_SECOND)))
+        self.ring = bytearray(self.capacity * FRAME_SIZE)
+        # Frames written and read so far; their difference is the fill level
+        self.written = 0
+        self.consumed = 0
+        self.finished = False
+        self.closed = False
+        self.full = False
+        self.stable_since = time.monotonic()
+        self.underruns = 0
+        self.full_waits = 0
+        self.condition = threading.Condition()
+        buffer_stats.add(streams=1)
+        self.thread = threading.Thread(target=self._fill, name=f"audio-buffer:{id(self):#x}", daemon=True)
+        self.thread.start()
+
+    @property
+    def level(self):
+        return self.written - self.consumed
+
+    def _fill(self):
+        """Reader thread: keep up to depth frames ahead of playback"""
+        try:
+            while True:
+                with self.condition:
+                    while not self.closed and self.level >= self.depth:
+                        if not self.full:
+                            # Count each time the buffer tops out, not every frame it waits
+                            self.full = True
+                            self.full_waits += 1
+                            buffer_stats.add(full_waits=1)
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                    if self.level < self.depth // 2:
+                        self.full = False
+
+                frame = self.original.read()
+                if len(frame) != FRAME_SIZE:
+                    return
+
+                with self.condition:
+                    offset = (self.written % self.capacity) * FRAME_SIZE
+                    self.ring[offset:offset + FRAME_SIZE] = frame
+                    self.written += 1
+                    self.condition.notify_all()
+        except Exception as e:
+            if not self.closed:
+                print(f"Error reading audio into buffer: {str(e)}")
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def _underrun(self):
+        """The buffer ran dry mid-track: grow it and wait until a little audio is back"""
+        self.underruns += 1
+        grown = self.depth < self.capacity
+        self.depth = min(self.capacity, self.depth * 2)
+        start = time.monotonic()
+        self.condition.notify_all()
+        while self.level < self.resume_at and not self.finished and not self.closed:
+            self.condition.wait()
+        self.stable_since = time.monotonic()
+        buffer_stats.add(underruns=1, grown=int(grown), stall_seconds=self.stable_since - start)
+
+    def _adapt(self, now):
+        """Shrink the depth after AUDIO_BUFFER_SHRINK_AFTER seconds without an underrun"""
+        if now - self.stable_since >= self.shrink_after and self.depth > self.min_depth:
+            self.depth = max(self.min_depth, self.depth * 3 // 4)
+            self.stable_since = now
+            buffer_stats.add(shrunk=1)
+
+    def read(self):
+        with self.condition:
+            if self.consumed == 0:
+                # Start as soon as there is audio, like reading ffmpeg directly would
+                while self.level == 0 and not self.finished and not self.closed:
+                    self.condition.wait()
+            elif self.level == 0 and not self.finished and not self.closed:
+                self._underrun()
+            else:
+                self._adapt(time.monotonic())
+
+            if self.level == 0:
+                return b''
+            offset = (self.consumed % self.capacity) * FRAME_SIZE
+            frame = bytes(self.ring[offset:offset + FRAME_SIZE])
+            self.consumed += 1
+            self.condition.notify_all()
+            return frame
+
+    def read_frames(self, max_frames):
+        """What read() returns, followed by up to max_frames - 1 frames already buffered"""
+        first = self.read()
+        if not first:
+            return first
+        with self.condition:
+            count = min(max_frames - 1, self.level)
+            if count <= 0:
+                return first
+            start = (self.consumed % self.capacity) * FRAME_SIZE
+            end = start + count * FRAME_SIZE
+            if end <= len(self.ring):
+                rest = bytes(self.ring[start:end])
+            else:
+                rest = bytes(self.ring[start:]) + bytes(self.ring[:end - len(self.ring)])
+            self.consumed += count
+            self.condition.notify_all()
+        return first + rest
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        # Killing ffmpeg ends a read the reader thread may be blocked in
+        self.original.cleanup()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            'level': self.level / FRAMES_PER_SECOND,
+            'depth': self.depth / FRAMES_PER_SECOND,
+            'underruns': self.underruns,
+            'full_waits': self.full_waits
+        }
+
+# Shared by every buffered source on this process
+buffer_stats = BufferStats()
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from config.config import (
+    AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, AUDIO_CACHE_MAX_DURATION, AUDIO_CACHE_FILL_WORKERS,
+    AUDIO_CACHE_REPORT_INTERVAL
+)
+
+# Range size per request; googlevideo throttles large single requests
+CHUNK_SIZE = 10 * 1024 * 1024
+# Seconds since a temporary file was last written before it counts as left
+# over; younger ones may belong to a fill running in another process
+STALE_PART_SECONDS = 3600
+# <video ID>-<format ID>.<ext>; format IDs are stored without dashes, so
+# the last dash separates them from video IDs, which may contain dashes
+FILENAME_REGEX = r'^([a-zA-Z0-9_-]+)-([a-zA-Z0-9_]+)\.([a-z0-9]+)$'
+
+def format_key(format_id):
+    """Format ID as it appears in cached filenames"""
+    return re.sub(r'[^a-zA-Z0-9_]', '_', str(format_id or 'audio'))
+
+class AudioCache:
+    """Size-bounded LRU cache of audio files keyed by video ID and format.
+
+    Files are filled in the background while the first play streams, and
+    written to a temporary name first so a partial file is never served.
+    A file is only served for the format it was downloaded in, so callers
+    can trust the extracted info's codec (e.g. for Opus stream copy).
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # (video_id, format key) -> (path, size), least recently used first
+        self.files = OrderedDict()
+        self.total_bytes = 0
+        self.filling = set()
+        # Called with (video_id, path) from the fill thread when a fill ends; path is None if it failed
+        self.on_fill = []
+        self.executor = None
+        self.task = None
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if self.enabled:
+            self._load()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _load(self):
+        """Index files left by earlier runs, oldest access first"""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            match = re.match(FILENAME_REGEX, name)
+            if not match:
+                if name.endswith('.part'):
+                    self._remove_stale(path)
+                continue
+            stat = os.stat(path)
+            found.append((stat.st_atime, (match.group(1), match.group(2)), path, stat.st_size))
+
+        for _, key, path, size in sorted(found):
+            self.files[key] = (path, size)
+            self.total_bytes += size
+        self._evict(0)
+
+    @staticmethod
+    def _remove_stale(path):
+        """Delete a temporary file left over from an interrupted fill.
+
+        This runs on import, which spawned extraction workers repeat, so a
+        fill still writing (from this process or any other) is left alone.
+        """
+        try:
+            if time.time() - os.path.getmtime(path) > STALE_PART_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, video_id, format_id):
+        """Get the cached file for a video in the given format, or None"""
+        if not self.enabled or not video_id:
+            return None
+        key = (video_id, format_key(format_id))
+        with self.lock:
+            cached = self.files.get(key)
+            if cached and os.path.exists(cached[0]):
+                self.files.move_to_end(key)
+                self.hits += 1
+                self.bytes_saved += cached[1]
+                return cached[0]
+            if cached:
+                self._remove(key)
+            self.misses += 1
+        return None
+
+    def path(self, video_id):
+        """Get a cached file for a video in any format, without counting a hit or refreshing it"""
+        if not self.enabled or not video_id:
+            return None
+        with self.lock:
+            paths = [path for (cached_id, _), (path, _) in self.files.items() if cached_id == video_id]
+        return next((path for path in paths if os.path.exists(path)), None)
+
+    def should_fill(self, data):
+        """Whether a stream is worth downloading into the cache"""
+        if not self.enabled or not data.get('id') or not data.get('url') or data.get('is_live'):
+            return False
+        if data.get('protocol', 'https') not in ('http', 'https'):
+            # HLS and DASH manifests cannot be fetched as one file
+            return False
+        if (data.get('duration') or 0) > AUDIO_CACHE_MAX_DURATION:
+            return False
+        size = data.get('filesize') or data.get('filesize_approx') or 0
+        return size <= self.max_bytes
+
+    def schedule_fill(self, data):
+        """Download a stream into the cache in the background"""
+        if not self.should_fill(data):
+            return
+        key = (data['id'], format_key(data.get('format_id')))
+        with self.lock:
+            if key in self.files or key in self.filling:
+                return
+            self.filling.add(key)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=AUDIO_CACHE_FILL_WORKERS, thread_name_prefix='audio-cache')
+        self.executor.submit(self._fill, data)
+
+    def _fill(self, data):
+        video_id = data['id']
+        key = (video_id, format_key(data.get('format_id')))
+        name = f"{video_id}-{key[1]}.{data.get('ext', 'webm')}"
+        path = os.path.join(self.directory, name)
+        temp_path = os.path.join(self.directory, f"{uuid.uuid4().hex}.part")
+        try:
+            size = self._download(data['url'], data.get('http_headers') or {}, temp_path)
+            with self.lock:
+                self._evict(size)
+                # Atomic on the same filesystem, so readers never see a partial file
+                os.replace(temp_path, path)
+                self.files[key] = (path, size)
+                self.total_bytes += size
+            print(f"Cached audio for {video_id} ({size // 1024} KiB)")
+        except Exception as e:
+            print(f"Error caching audio for {video_id}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            path = None
+        finally:
+            with self.lock:
+                self.filling.discard(key)
+        for callback in self.on_fill:
+            try:
+                callback(video_id, path)
+            except Exception as e:
+                print(f"Error in audio cache fill callback: {str(e)}")
+
+    def _download(self, url, headers, temp_path):
+        """Download url to temp_path in ranged chunks and return its size"""
+        written = 0
+        with requests.Session() as session, open(temp_path, 'wb') as f:
+            while True:
+                range_headers = dict(headers, Range=f"bytes={written}-{written + CHUNK_SIZE - 1}")
+                response = session.get(url, headers=range_headers, stream=True, timeout=30)
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=256 * 1024):
+                    f.write(chunk)
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        raise ValueError("file exceeds cache budget")
+
+                # A 200 means the server ignored Range and sent the whole file
+                content_range = response.headers.get('Content-Range', '')
+                total = int(content_range.rsplit('/', 1)[-1]) if '/' in content_range else written
+                if response.status_code != 206 or written >= total:
+                    return written
+
+    def _evict(self, incoming):
+        """Drop least recently used files until incoming bytes fit"""
+        while self.files and self.total_bytes + incoming > self.max_bytes:
+            self._remove(next(iter(self.files)))
+
+    def _remove(self, key):
+        path, size = self.files.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def start(self, bot):
+        """Log hit rate and bytes saved every AUDIO_CACHE_REPORT_INTERVAL seconds on the bot's loop"""
+        if self.enabled and AUDIO_CACHE_REPORT_INTERVAL > 0 and (self.task is None or self.task.done()):
+            self.task = bot.loop.create_task(self._report_loop())
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(AUDIO_CACHE_REPORT_INTERVAL)
+            if self.hits or self.misses:
+                self.report()
+
+    def report(self):
+        stats = self.stats()
+        print(f"Audio cache: {stats['files']} files ({stats['bytes'] / 1024 ** 2:.0f} MB), "
+              f"hit rate {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}), "
+              f"{stats['bytes_saved'] / 1024 ** 2:.0f} MB saved")
+
+    def stats(self):
+        """Get hit rate and bytes saved"""
+        total = self.hits + self.misses
+        return {
+            'files': len(self.files),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'bytes_saved': self.bytes_saved
+        }
+
+audio_cache = AudioCache()
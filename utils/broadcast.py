@@ -0,0 +1,223 @@
+import threading
+import discord
+from config.config import BROADCAST_WINDOW_SECONDS, BROADCAST_AHEAD_SECONDS
+from utils.audio_cache import audio_cache
+from utils.youtube_handler import TrackData, YTDLOpusSource
+
+# Opus packets per second; discord.py sends one every 20 ms
+FRAMES_PER_SECOND = 50
+
+class Broadcast:
+    """One ffmpeg Opus stream of a track, shared by every voice client playing it.
+
+    A producer thread reads packets into a ring holding
+    BROADCAST_WINDOW_SECONDS behind the furthest listener and up to
+    BROADCAST_AHEAD_SECONDS in front of it. Each listener keeps its own
+    position; one that falls out of the window (a paused player, say)
+    skips forward to the oldest packet still held.
+    """
+
+    def __init__(self, key, source, *, live=False, window_seconds=BROADCAST_WINDOW_SECONDS,
+                 ahead_seconds=BROADCAST_AHEAD_SECONDS):
+        self.key = key
+        self.source = source
+        self.live = live
+        self.window = max(1, int(window_seconds * FRAMES_PER_SECOND))
+        self.ahead = max(1, int(ahead_seconds * FRAMES_PER_SECOND))
+        self.capacity = self.window + self.ahead
+        self.packets = [None] * self.capacity
+        # Packets produced so far; packet n sits at n % capacity
+        self.written = 0
+        self.listeners = set()
+        self.finished = False
+        self.closed = False
+        self.skipped = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._produce, name=f"broadcast:{key[0]}", daemon=True)
+        self.thread.start()
+
+    @property
+    def oldest(self):
+        """Index of the oldest packet still in the ring"""
+        return max(0, self.written - self.capacity)
+
+    def leader(self):
+        """Position of the furthest listener that has started playing, or None"""
+        positions = [listener.position for listener in self.listeners if listener.position is not None]
+        return max(positions) if positions else None
+
+    def joinable(self):
+        """Whether a new listener can still hear the track from the start (any time, if live)"""
+        with self.condition:
+            if self.closed or self.finished:
+                return False
+            if self.live:
+                return True
+            leader = self.leader()
+            return self.oldest == 0 and (leader is None or leader <= self.window // 2)
+
+    def _produce(self):
+        """Producer thread: stay up to `ahead` packets in front of the furthest listener"""
+        try:
+            while True:
+                with self.condition:
+                    while not self.closed and self.written - (self.leader() or 0) >= self.ahead:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+
+                packet = self.source.read()
+                if not packet:
+                    return
+
+                with self.condition:
+                    self.packets[self.written % self.capacity] = packet
+                    self.written += 1
+                    self.condition.notify_all()
+        except Exception as e:
+            if not self.closed:
+                print(f"Error reading broadcast of {self.key[0]}: {str(e)}")
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def read(self, listener):
+        with self.condition:
+            if listener.position is None:
+                # Live streams join where the others are; tracks start from the top
+                leader = self.leader() if self.live else None
+                listener.position = leader if leader is not None else 0
+            if listener.position < self.oldest:
+                self.skipped += self.oldest - listener.position
+                listener.position = self.oldest
+            while listener.position >= self.written and not self.finished and not self.closed:
+                self.condition.wait()
+            if listener.position >= self.written or self.closed:
+                return b''
+
+            packet = self.packets[listener.position % self.capacity]
+            listener.position += 1
+            # May let the producer move ahead
+            self.condition.notify_all()
+            return packet
+
+    def guild_ids(self):
+        """Guilds listening, so the ffmpeg supervisor can reap a broadcast nobody hears"""
+        with self.condition:
+            return {listener.guild_id for listener in self.listeners}
+
+    def attach(self, listener):
+        with self.condition:
+            self.listeners.add(listener)
+
+    def detach(self, listener):
+        """Drop a listener; returns True when it was the last one"""
+        with self.condition:
+            self.listeners.discard(listener)
+            if self.listeners or self.closed:
+                return False
+            self.closed = True
+            self.condition.notify_all()
+        # Killing ffmpeg ends a read the producer may be blocked in
+        self.source.cleanup()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        return True
+
+class BroadcastSource(TrackData, discord.AudioSource):
+    """One voice client's view of a Broadcast; hands out Opus packets without encoding"""
+
+    def __init__(self, broadcast, data, guild_id=None):
+        self.set_data(data)
+        self.broadcast = broadcast
+        self.guild_id = guild_id
+        # Next packet to play; None until the first read
+        self.position = None
+        broadcast.attach(self)
+
+    @property
+    def expired(self):
+        """Whether the track's start left the window before this listener began playing"""
+        broadcast = self.broadcast
+        if broadcast is None or broadcast.closed:
+            return True
+        return self.position is None and not broadcast.live and broadcast.oldest > 0
+
+    def read(self):
+        broadcast = self.broadcast
+        return broadcast.read(self) if broadcast else b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        # Called by both discord.py's player thread and the player loop
+        broadcast, self.broadcast = self.broadcast, None
+        if broadcast and broadcast.detach(self):
+            broadcast_hub.remove(broadcast)
+
+class BroadcastHub:
+    """Broadcasts running on this process, keyed by video and volume"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (video ID, volume) -> [Broadcast]
+        self.broadcasts = {}
+        self.started = 0
+        self.joined = 0
+
+    @staticmethod
+    def key(data, volume):
+        return (data.get('id') or data['url'], round(volume, 3))
+
+    def join(self, data, volume, guild_id=None):
+        """Listen to a running broadcast of the track, or return None"""
+        with self.lock:
+            for broadcast in self.broadcasts.get(self.key(data, volume), ()):
+                if broadcast.joinable():
+                    self.joined += 1
+                    return BroadcastSource(broadcast, data, guild_id)
+        return None
+
+    def start(self, data, volume, guild_id=None):
+        """Start a broadcast of the track and return its first listener.
+
+        This spawns ffmpeg, so callers hold an ffmpeg_supervisor.slot() around it.
+        """
+        filename = audio_cache.get(data.get('id'), data.get('format_id'))
+        if filename is None:
+            audio_cache.schedule_fill(data)
+        # Shared by many guilds, so the process belongs to none of them; it
+        # is killed when the last listener cleans up, or by the reaper once
+        # none of the listening guilds is in voice
+        source = YTDLOpusSource.from_data(data, filename, volume=volume, flush=True)
+        broadcast = Broadcast(self.key(data, volume), source, live=bool(data.get('is_live')))
+        listener = BroadcastSource(broadcast, data, guild_id)
+        source.guild_ids = broadcast.guild_ids
+        with self.lock:
+            self.broadcasts.setdefault(broadcast.key, []).append(broadcast)
+            self.started += 1
+        return listener
+
+    def remove(self, broadcast):
+        with self.lock:
+            running = self.broadcasts.get(broadcast.key, [])
+            if broadcast in running:
+                running.remove(broadcast)
+            if not running:
+                self.broadcasts.pop(broadcast.key, None)
+
+    def stats(self):
+        with self.lock:
+            running = [b for broadcasts in self.broadcasts.values() for b in broadcasts]
+        return {
+            'tracks': len(running),
+            'listeners': sum(len(b.listeners) for b in running),
+            'started': self.started,
+            'joined': self.joined,
+            'skipped': sum(b.skipped for b in running)
+        }
+
+# Shared by every player on this process
+broadcast_hub = BroadcastHub()
@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from config.config import CLUSTER_STATS_INTERVAL
+from utils.resolve_cache import resolution_cache
+
+# Info fields playback needs; format lists and the rest stay local
+SHARED_FIELDS = (
+    'id', 'title', 'url', 'duration', 'thumbnail', 'webpage_url', 'acodec', 'ext',
+    'format_id', 'protocol', 'filesize', 'filesize_approx', 'is_live', 'extractor_key', 'http_headers'
+)
+
+def shareable(data):
+    """Trim extracted info down to what another process needs to play it"""
+    return {field: data[field] for field in SHARED_FIELDS if field in data}
+
+class ClusterLink:
+    """A cluster process's end of the local IPC channel to the launcher.
+
+    Reports this process's stats on an interval, shares every track it
+    resolves and caches the tracks the other processes resolve, so a song
+    trending across shards is extracted once per cluster.
+    """
+
+    def __init__(self, conn, shard_ids, interval=CLUSTER_STATS_INTERVAL):
+        self.conn = conn
+        self.shard_ids = shard_ids
+        self.interval = interval
+        self.bot = None
+        # Blocks on the pipe so the event loop does not
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cluster-ipc')
+        self.shared = 0
+        self.received = 0
+
+    def start(self, bot):
+        """Start exchanging messages on the bot's loop"""
+        self.bot = bot
+        resolution_cache.on_put = self.share
+        bot.loop.create_task(self._receive_loop())
+        bot.loop.create_task(self._stats_loop())
+
+    def share(self, query, data):
+        self.shared += 1
+        self._send(('cache', query, shareable(data)))
+
+    def _send(self, message):
+        try:
+            self.conn.send(message)
+        except (OSError, ValueError) as e:
+            print(f"Error sending to cluster launcher: {str(e)}")
+
+    def stats(self):
+        """This process's share of the cluster stats"""
+        from utils.music_player import players
+        from utils.extraction_pool import extraction_pool
+        from utils.audio_cache import audio_cache
+        from utils.ffmpeg_supervisor import ffmpeg_supervisor
+        from utils.audio_buffer import buffer_stats
+        from utils.loudness import loudness_index
+        from utils.broadcast import broadcast_hub
+
+        return {
+            'guilds': len(self.bot.guilds),
+            'players': len(players),
+            'latency': self.bot.latency,
+            'resolution_cache': resolution_cache.stats(),
+            'audio_cache': audio_cache.stats(),
+            'extraction_pool': extraction_pool.stats(),
+            'ffmpeg': ffmpeg_supervisor.stats(),
+            'audio_buffer': buffer_stats.stats(),
+            'loudness': loudness_index.stats(),
+            'broadcast': broadcast_hub.stats(),
+            'shared': self.shared,
+            'received': self.received
+        }
+
+    async def _receive_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                message = await loop.run_in_executor(self.executor, self.conn.recv)
+            except (EOFError, OSError):
+                print("Cluster launcher went away, shutting down")
+                await self.bot.close()
+                return
+
+            if message[0] == 'cache':
+                _, query, data = message
+                # Not shared again, or the entry would bounce between processes
+                resolution_cache.put(query, data, notify=False)
+                self.received += 1
+
+    async def _stats_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._send(('stats', self.shard_ids, self.stats()))
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,122 @@
+import asyncio
+import glob
+import os
+import time
+from config.config import (
+    BROWSER_PATHS, CURRENT_OS, COOKIE_FILE, COOKIE_BROWSER,
+    COOKIE_EXPORT_DIR, COOKIE_REFRESH_INTERVAL
+)
+
+class CookieManager:
+    """Exports browser cookies once into a Netscape cookie file for yt-dlp.
+
+    Reading the browser's cookie database is slow and can fail on headless
+    hosts, so it happens on a schedule (or after an auth failure) instead
+    of on every extraction. Each export gets a new file name so workers
+    holding a YoutubeDL built with the old file notice the change.
+    """
+
+    def __init__(self, cookie_file=COOKIE_FILE, browser=COOKIE_BROWSER,
+                 export_dir=COOKIE_EXPORT_DIR, refresh_interval=COOKIE_REFRESH_INTERVAL):
+        self.cookie_file = cookie_file
+        self.browser = browser
+        self.export_dir = export_dir
+        self.refresh_interval = refresh_interval
+        self.path = None
+        self.exported_at = 0
+        self.lock = None
+        self.task = None
+        self.failures = 0
+
+    def find_browser(self):
+        """Get (browser, profile path) for the first installed browser"""
+        if CURRENT_OS not in BROWSER_PATHS:
+            print(f"Unsupported OS: {CURRENT_OS}")
+            return None
+
+        for browser, path in BROWSER_PATHS[CURRENT_OS].items():
+            if self.browser and browser != self.browser:
+                continue
+            if os.path.exists(path):
+                print(f"Found {browser} at {path}")
+                return browser, path
+        return None
+
+    def _export(self):
+        """Extract browser cookies into a new cookie file and return its path"""
+        from yt_dlp.cookies import extract_cookies_from_browser
+
+        browser_info = self.find_browser()
+        if not browser_info:
+            return None
+        browser, profile = browser_info
+
+        jar = extract_cookies_from_browser(browser, profile)
+        os.makedirs(self.export_dir, exist_ok=True)
+        path = os.path.join(self.export_dir, f"cookies-{int(time.time())}.txt")
+        jar.save(path)
+
+        # Drop older exports; workers switch to the new file on their next job
+        for old in glob.glob(os.path.join(self.export_dir, 'cookies-*.txt')):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        print(f"Exported {len(jar)} {browser} cookies to {path}")
+        return path
+
+    def _stale(self):
+        return not self.exported_at or time.monotonic() - self.exported_at >= self.refresh_interval
+
+    async def refresh(self, force=True):
+        """Export cookies again, keeping the previous file if that fails.
+
+        Without force, only export if the file is still stale once the lock
+        is held, so callers queued behind an export reuse its result.
+        """
+        if self.cookie_file:
+            return self.cookie_file
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            if not force and not self._stale():
+                return self.path
+            loop = asyncio.get_event_loop()
+            try:
+                path = await loop.run_in_executor(None, self._export)
+            except Exception as e:
+                self.failures += 1
+                print(f"Error exporting browser cookies: {str(e)}")
+                path = None
+            if path:
+                self.path = path
+            # Also counts failed attempts so a broken browser is not retried per song
+            self.exported_at = time.monotonic()
+        return self.path
+
+    async def get_cookiefile(self):
+        """Get the cookie file to hand to yt-dlp, or None"""
+        if self.cookie_file:
+            return self.cookie_file
+        if self._stale():
+            await self.refresh(force=False)
+        return self.path
+
+    def invalidate(self):
+        """Re-export soon, e.g. after YouTube rejected the current cookies"""
+        if not self.cookie_file:
+            self.exported_at = 0
+
+    def start(self):
+        """Refresh cookies in the background on a schedule"""
+        if self.task is None and not self.cookie_file:
+            self.task = asyncio.get_event_loop().create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+cookie_manager = CookieManager()
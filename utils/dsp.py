@@ -0,0 +1,231 @@
+import math
+from functools import lru_cache
+from config.config import (
+    DSP_BATCH_FRAMES, VOLUME_RAMP_SECONDS, LIMITER_THRESHOLD_DB, LIMITER_RELEASE_SECONDS
+)
+
+try:
+    import numpy as np
+except ImportError:
+    # Effects need NumPy (the 'effects' extra); without it playback keeps
+    # PCMVolumeTransformer's volume only and !eq says so
+    print("NumPy is not installed, audio effects are disabled")
+    np = None
+
+DSP_AVAILABLE = np is not None
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+# Samples filtered per block; divides the 960 samples of a discord.py frame
+BLOCK = 64
+BLOCKS_PER_FRAME = 960 // BLOCK
+
+# (filter type, frequency in Hz, gain in dB, Q) per band
+PRESETS = {
+    'bass': [('lowshelf', 100, 6.0, 0.7)],
+    'bassboost': [('lowshelf', 80, 10.0, 0.7), ('peaking', 250, -2.0, 1.0)],
+    'treble': [('highshelf', 6000, 6.0, 0.7)],
+    'vocal': [('lowshelf', 150, -3.0, 0.7), ('peaking', 2500, 4.0, 1.0)],
+    'night': [('lowshelf', 120, -6.0, 0.7), ('highshelf', 8000, -4.0, 0.7)]
+}
+
+@lru_cache(maxsize=None)
+def biquad_coefficients(kind, freq, gain_db, q):
+    """Normalized (b0, b1, b2, a1, a2) from the Audio EQ Cookbook"""
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * freq / SAMPLE_RATE
+    cos, alpha = math.cos(w0), math.sin(w0) / (2 * q)
+    root = 2 * math.sqrt(a) * alpha
+
+    if kind == 'peaking':
+        b = (1 + alpha * a, -2 * cos, 1 - alpha * a)
+        den = (1 + alpha / a, -2 * cos, 1 - alpha / a)
+    elif kind == 'lowshelf':
+        b = (a * ((a + 1) - (a - 1) * cos + root), 2 * a * ((a - 1) - (a + 1) * cos), a * ((a + 1) - (a - 1) * cos - root))
+        den = ((a + 1) + (a - 1) * cos + root, -2 * ((a - 1) + (a + 1) * cos), (a + 1) + (a - 1) * cos - root)
+    elif kind == 'highshelf':
+        b = (a * ((a + 1) + (a - 1) * cos + root), -2 * a * ((a - 1) + (a + 1) * cos), a * ((a + 1) + (a - 1) * cos - root))
+        den = ((a + 1) - (a - 1) * cos + root, 2 * ((a - 1) - (a + 1) * cos), (a + 1) - (a - 1) * cos - root)
+    else:
+        raise ValueError(f"Unknown filter type: {kind}")
+    return b[0] / den[0], b[1] / den[0], b[2] / den[0], den[1] / den[0], den[2] / den[0]
+
+class BiquadKernel:
+    """Precomputed block matrices for one biquad's coefficients.
+
+    A biquad is recursive, so it cannot be vectorized sample by sample.
+    In state-space form the output of a BLOCK-sample block is its
+    zero-state response (one matrix product with the impulse response)
+    plus the effect of the two-value state it starts in. The states at
+    every block boundary of a batch come from one more product with
+    precomputed powers of the transition matrix, so a whole batch is
+    filtered with a handful of NumPy calls.
+    """
+
+    def __init__(self, coefficients, max_blocks=DSP_BATCH_FRAMES * BLOCKS_PER_FRAME):
+        self.max_blocks = max_blocks
+        b0, b1, b2, a1, a2 = coefficients
+        a = np.array([[-a1, 1.0], [-a2, 0.0]])
+        b = np.array([b1 - a1 * b0, b2 - a2 * b0])
+        c = np.array([1.0, 0.0])
+
+        powers = [np.eye(2)]
+        for _ in range(BLOCK):
+            powers.append(a @ powers[-1])
+        impulse = [b0] + [c @ powers[k - 1] @ b for k in range(1, BLOCK)]
+
+        # Zero-state response: h[n - m] below the diagonal
+        self.response = np.zeros((BLOCK, BLOCK))
+        for n in range(BLOCK):
+            self.response[n, :n + 1] = impulse[n::-1]
+        # Output of the starting state, and what each input sample leaves in the final state
+        self.from_state = np.array([c @ powers[n] for n in range(BLOCK)])
+        self.to_state = np.stack([powers[BLOCK - 1 - m] @ b for m in range(BLOCK)], axis=1)
+
+        # States at block boundaries: s_k = A^(kN) s_0 + sum over j < k of A^((k-1-j)N) u_j
+        block_power = powers[BLOCK]
+        block_powers = [np.eye(2)]
+        for _ in range(max_blocks):
+            block_powers.append(block_power @ block_powers[-1])
+        self.initial = np.concatenate(block_powers)
+        self.carry = np.zeros(((max_blocks + 1) * 2, max_blocks * 2))
+        for k in range(1, max_blocks + 1):
+            for j in range(k):
+                self.carry[k * 2:k * 2 + 2, j * 2:j * 2 + 2] = block_powers[k - 1 - j]
+
+        # The state path stays in float64: low shelves have poles close to 1,
+        # so their state is large and float32 rounding shows up in the output
+        self.response = self.prepare(self.response, np.float32)
+        self.from_state = self.prepare(self.from_state, np.float64)
+        self.to_state = self.prepare(self.to_state, np.float64)
+        self.initial = self.prepare(self.initial, np.float64)
+        self.carry = self.prepare(self.carry, np.float64)
+
+    @staticmethod
+    def prepare(matrix, dtype):
+        """Transpose for right-multiplication and zero the tail of decayed powers,
+        which would otherwise turn into slow denormal arithmetic"""
+        matrix = matrix.T.astype(dtype)
+        matrix[np.abs(matrix) < 1e-20] = 0
+        return matrix
+
+@lru_cache(maxsize=None)
+def biquad_kernel(kind, freq, gain_db, q):
+    """Kernels are shared by every stream using the same band"""
+    return BiquadKernel(biquad_coefficients(kind, freq, gain_db, q))
+
+class Biquad:
+    """One EQ band with its own filter state"""
+
+    def __init__(self, kind, freq, gain_db, q):
+        self.kernel = biquad_kernel(kind, freq, gain_db, q)
+        self.state = np.zeros((CHANNELS, 2))
+
+    def process(self, x):
+        span = self.kernel.max_blocks * BLOCK
+        if x.shape[1] <= span:
+            return self._process(x)
+        return np.concatenate([self._process(x[:, start:start + span]) for start in range(0, x.shape[1], span)], axis=1)
+
+    def _process(self, x):
+        kernel = self.kernel
+        blocks = x.shape[1] // BLOCK
+        x = x.reshape(CHANNELS, blocks, BLOCK)
+        y = x @ kernel.response
+        contributions = (x @ kernel.to_state).reshape(CHANNELS, blocks * 2)
+        states = (contributions @ kernel.carry[:blocks * 2, :(blocks + 1) * 2]
+                  + self.state @ kernel.initial[:, :(blocks + 1) * 2]).reshape(CHANNELS, blocks + 1, 2)
+        y += states[:, :blocks] @ kernel.from_state
+        self.state = states[:, blocks]
+        return y.reshape(CHANNELS, blocks * BLOCK)
+
+class Volume:
+    """Gain that moves to a new level over VOLUME_RAMP_SECONDS instead of jumping"""
+
+    def __init__(self, gain, ramp_seconds=VOLUME_RAMP_SECONDS):
+        self.gain = gain
+        self.target = gain
+        # Gain change per sample; a full 0 to 1 sweep takes ramp_seconds
+        self.step = 1 / max(1, ramp_seconds * SAMPLE_RATE)
+
+    @property
+    def ramping(self):
+        return self.gain != self.target
+
+    def process(self, x):
+        if not self.ramping:
+            x *= self.gain
+            return x
+        steps = np.arange(1, x.shape[1] + 1, dtype=np.float32) * self.step
+        if self.target > self.gain:
+            ramp = np.minimum(self.gain + steps, self.target)
+        else:
+            ramp = np.maximum(self.gain - steps, self.target)
+        x *= ramp
+        self.gain = float(ramp[-1])
+        return x
+
+class Limiter:
+    """Peak limiter: gain drops at once on a loud block and recovers over LIMITER_RELEASE_SECONDS"""
+
+    def __init__(self, threshold_db=LIMITER_THRESHOLD_DB, release_seconds=LIMITER_RELEASE_SECONDS):
+        self.threshold = 32767 * 10 ** (threshold_db / 20)
+        # Gain recovered per block
+        self.release = BLOCK / max(1, release_seconds * SAMPLE_RATE)
+        self.gain = 1.0
+
+    def process(self, x):
+        blocks = x.shape[1] // BLOCK
+        peaks = np.abs(x).reshape(CHANNELS, blocks, BLOCK).max(axis=(0, 2))
+        targets = np.minimum(1.0, self.threshold / np.maximum(peaks, 1.0))
+        # g_k = min(target_k, g_(k-1) + release), unrolled into a running minimum
+        recovery = np.arange(1, blocks + 1) * self.release
+        gains = recovery + np.minimum(self.gain, np.minimum.accumulate(targets - recovery))
+        self.gain = float(gains[-1])
+        x = x.reshape(CHANNELS, blocks, BLOCK)
+        x *= gains.astype(np.float32)[:, None]
+        return x.reshape(CHANNELS, blocks * BLOCK)
+
+class FilterChain:
+    """EQ bands, volume and limiter applied to batches of 16-bit stereo PCM.
+
+    Frames are viewed as int16 without copying, filtered as float32
+    channel rows and written back as int16. The chain is only active
+    while an EQ preset is set or the volume is ramping; otherwise the
+    source plays through PCMVolumeTransformer untouched.
+    """
+
+    def __init__(self, volume, preset=None):
+        self.volume = Volume(volume)
+        self.preset = None
+        # (EQ bands, limiter or None)
+        self.stages = ([], None)
+        self.set_preset(preset)
+
+    @property
+    def active(self):
+        return self.preset is not None or self.volume.ramping
+
+    def set_preset(self, preset):
+        """Switch EQ preset (None for none); the limiter comes with any preset"""
+        if preset is not None and preset not in PRESETS:
+            raise ValueError(f"Unknown preset: {preset}")
+        bands = [Biquad(*band) for band in PRESETS[preset]] if preset else []
+        # Swapped in one assignment; the player thread may be mid-batch
+        self.stages = (bands, Limiter() if preset else None)
+        self.preset = preset
+
+    def set_volume(self, volume):
+        self.volume.target = volume
+
+    def process(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, CHANNELS)
+        x = samples.T.astype(np.float32, order='C')
+        bands, limiter = self.stages
+        for band in bands:
+            x = band.process(x)
+        x = self.volume.process(x)
+        if limiter:
+            x = limiter.process(x)
+        np.clip(x, -32768, 32767, out=x)
+        return x.T.astype(np.int16).tobytes()
@@ -0,0 +1,308 @@
+import asyncio
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from config.config import (
+    EXTRACTION_WORKERS, EXTRACTION_QUEUE_SIZE, EXTRACTION_GUILD_QUEUE_SIZE,
+    EXTRACTION_SEARCH_TIMEOUT, EXTRACTION_EXTRACT_TIMEOUT, EXTRACTION_DOWNLOAD_TIMEOUT,
+    EXTRACTION_START_TIMEOUT, EXTRACTION_STUCK_AFTER
+)
+
+# Deadline for each kind of job, counted from when a worker picks it up
+STAGE_TIMEOUTS = {
+    'search': EXTRACTION_SEARCH_TIMEOUT,
+    'extract': EXTRACTION_EXTRACT_TIMEOUT,
+    'download': EXTRACTION_DOWNLOAD_TIMEOUT
+}
+
+class ExtractionError(Exception):
+    """Raised when a worker fails to extract info"""
+
+class ExtractionTimeout(ExtractionError):
+    """Raised when a job runs past its stage deadline"""
+
+def _retrieve(future):
+    """Mark a pipe read's error retrieved; reads end in errors when workers are killed"""
+    if not future.cancelled():
+        future.exception()
+
+def job_stage(options, download):
+    """Which deadline applies to a job"""
+    if download:
+        return 'download'
+    return 'search' if options.get('extract_flat') else 'extract'
+
+def _worker_main(conn, warmup=None):
+    """Worker process entry point: serve extraction jobs with pooled YoutubeDL instances"""
+    from utils.ytdl_pool import YoutubeDLPool
+
+    pool = YoutubeDLPool()
+    if warmup:
+        # Load the extractors and the current player's deciphering code
+        # before the first real job arrives
+        url, options = warmup
+        pooled = pool.checkout(options)
+        ok = True
+        try:
+            if url:
+                pooled.ytdl.extract_info(url, download=False)
+        except Exception as e:
+            ok = False
+            print(f"Extraction worker warmup failed: {str(e)}")
+        pool.checkin(pooled, ok)
+    conn.send(('ready', None, None))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+
+        url, download, options = job
+        pooled = pool.checkout(options)
+        ok = False
+        try:
+            ytdl = pooled.ytdl
+            data = ytdl.extract_info(url, download=download)
+            # Flat searches return every candidate, full extractions the first match
+            if 'entries' in data and not options.get('extract_flat'):
+                data = data['entries'][0]
+            filename = ytdl.prepare_filename(data) if download else None
+            reply = ('ok', ytdl.sanitize_info(data), filename)
+            ok = True
+        except Exception as e:
+            reply = ('error', str(e), None)
+        pool.checkin(pooled, ok)
+        conn.send(reply)
+    pool.close()
+
+class _Worker:
+    def __init__(self, context, target=_worker_main, args=(), kwargs=None):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=target, args=(child_conn,) + tuple(args), kwargs=kwargs or {}, daemon=True)
+        self.process.start()
+        child_conn.close()
+        # When the job being run was sent, or None while idle
+        self.started = None
+
+    def kill(self):
+        """Kill the process; a thread blocked on recv() then gets EOFError"""
+        self.process.kill()
+        self.process.join(timeout=1)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+class ExtractionPool:
+    """Process pool that runs yt-dlp extraction outside the bot's GIL.
+
+    Jobs queue per guild and workers take them round robin across guilds,
+    so a guild queueing a long playlist cannot starve the others. When the
+    queue is full, extract() waits for room instead of piling up work.
+
+    yt-dlp cannot be interrupted, so a job that outlives its stage deadline
+    or whose caller gives up has its worker process killed and replaced.
+    """
+
+    def __init__(self, size=EXTRACTION_WORKERS, max_pending=EXTRACTION_QUEUE_SIZE,
+                 max_pending_per_guild=EXTRACTION_GUILD_QUEUE_SIZE, target=_worker_main, target_args=()):
+        self.size = max(1, size)
+        # Worker entry point, replaceable with a stand-in for benchmarks
+        self.target = target
+        self.target_args = target_args
+        # (url, options) each worker extracts once before taking jobs
+        self.warmup = None
+        self.max_pending = max_pending
+        self.max_pending_per_guild = max_pending_per_guild
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = []
+        self.tasks = []
+        # guild_id -> deque of (url, download, options, future)
+        self.queues = OrderedDict()
+        self.pending = 0
+        # Workers currently running a job
+        self.busy = 0
+        self.condition = None
+        # Threads that block on worker pipes; they release the GIL while waiting
+        self.io_executor = None
+        self.timeouts = dict.fromkeys(STAGE_TIMEOUTS, 0)
+        self.cancelled = 0
+        self.replaced = 0
+
+    def start(self, warmup=None):
+        """Spawn the worker processes if they are not running yet.
+
+        warmup is an optional (url, options) pair; each worker builds its
+        YoutubeDL with those options and extracts the URL before serving.
+        """
+        if self.workers:
+            return
+        if warmup:
+            self.warmup = warmup
+        loop = asyncio.get_event_loop()
+        self.condition = asyncio.Condition()
+        # Room for the threads of killed workers that are still unwinding
+        self.io_executor = ThreadPoolExecutor(max_workers=self.size * 2, thread_name_prefix='extraction-io')
+        print(f"Starting {self.size} extraction workers")
+        for _ in range(self.size):
+            worker = self._spawn()
+            self.workers.append(worker)
+            self.tasks.append(loop.create_task(self._run_worker(worker)))
+
+    def _spawn(self, replacement=False):
+        warmup = self.warmup
+        if warmup and replacement:
+            # Replacements only build their YoutubeDL; the deciphering code is
+            # in the shared cache by now and a warmup request could hang too
+            warmup = (None, warmup[1])
+        kwargs = {'warmup': warmup} if warmup else None
+        return _Worker(self.context, self.target, self.target_args, kwargs)
+
+    def stop(self):
+        """Stop every worker process"""
+        for task in self.tasks:
+            task.cancel()
+        for worker in self.workers:
+            worker.stop()
+        self.tasks = []
+        self.workers = []
+        if self.io_executor:
+            self.io_executor.shutdown(wait=False)
+
+    def has_idle_worker(self):
+        """Whether a job submitted now would start right away"""
+        return self.pending == 0 and self.busy < len(self.workers)
+
+    def _has_room(self, guild_id):
+        return (self.pending < self.max_pending
+                and len(self.queues.get(guild_id, ())) < self.max_pending_per_guild)
+
+    def _next_job(self):
+        """Take the next job, rotating between guilds"""
+        guild_id, jobs = self.queues.popitem(last=False)
+        job = jobs.popleft()
+        if jobs:
+            self.queues[guild_id] = jobs
+        self.pending -= 1
+        return job
+
+    async def extract(self, url, options, *, download=False, guild_id=None):
+        """Extract info in a worker and return (data, filename)"""
+        self.start()
+        loop = asyncio.get_event_loop()
+
+        async with self.condition:
+            await self.condition.wait_for(lambda: self._has_room(guild_id))
+            future = loop.create_future()
+            self.queues.setdefault(guild_id, deque()).append((url, download, options, future))
+            self.pending += 1
+            self.condition.notify_all()
+
+        return await future
+
+    async def _wait_ready(self, worker):
+        """Wait for a new worker to finish starting, replacing it if it never does"""
+        loop = asyncio.get_event_loop()
+        while True:
+            ready = loop.run_in_executor(self.io_executor, worker.conn.recv)
+            ready.add_done_callback(_retrieve)
+            done, _ = await asyncio.wait({ready}, timeout=EXTRACTION_START_TIMEOUT)
+            if ready in done and ready.exception() is None:
+                return worker
+            print("Extraction worker failed to start, replacing it")
+            worker = await self._replace(worker, ready)
+
+    async def _replace(self, worker, recv=None):
+        """Kill a worker and start another in its place"""
+        worker.kill()
+        if recv is not None:
+            # The blocked recv() returns once the process is gone
+            await asyncio.wait({recv}, timeout=5)
+        worker.stop()
+
+        replacement = self._spawn(replacement=True)
+        self.workers[self.workers.index(worker)] = replacement
+        self.replaced += 1
+        return replacement
+
+    async def _run_worker(self, worker):
+        loop = asyncio.get_event_loop()
+        worker = await self._wait_ready(worker)
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.queues)
+                url, download, options, future = self._next_job()
+                # Wake submitters waiting for room
+                self.condition.notify_all()
+
+            if future.cancelled():
+                continue
+
+            stage = job_stage(options, download)
+            timeout = STAGE_TIMEOUTS[stage]
+            self.busy += 1
+            worker.started = time.monotonic()
+            try:
+                worker.conn.send((url, download, options))
+                recv = loop.run_in_executor(self.io_executor, worker.conn.recv)
+                recv.add_done_callback(_retrieve)
+                # A caller giving up cancels the future and ends the wait early
+                done, _ = await asyncio.wait({recv, future}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if recv not in done and future.done():
+                    # Short jobs are cheaper to let finish than a worker
+                    # restart; only kill the ones that look stuck
+                    limit = min(timeout, EXTRACTION_STUCK_AFTER)
+                    done, _ = await asyncio.wait({recv}, timeout=max(0, limit - (time.monotonic() - worker.started)))
+                if recv not in done:
+                    if future.done():
+                        self.cancelled += 1
+                        print("Extraction cancelled, restarting its worker")
+                    else:
+                        self.timeouts[stage] += 1
+                        print(f"Extraction {stage} timed out after {timeout}s, restarting its worker")
+                        future.set_exception(ExtractionTimeout(f"Extraction {stage} timed out after {timeout}s"))
+                    worker = await self._wait_ready(await self._replace(worker, recv))
+                    continue
+                status, result, filename = recv.result()
+            except (EOFError, OSError) as e:
+                print(f"Extraction worker died: {str(e)}")
+                if not future.done():
+                    future.set_exception(ExtractionError("Extraction worker crashed"))
+                worker = await self._wait_ready(await self._replace(worker))
+                continue
+            finally:
+                worker.started = None
+                self.busy -= 1
+
+            if future.done():
+                continue
+            if status == 'ok':
+                future.set_result((result, filename))
+            else:
+                future.set_exception(ExtractionError(result))
+
+    def stats(self):
+        """Timeout and restart counters, and workers running unusually long jobs"""
+        now = time.monotonic()
+        return {
+            'workers': len(self.workers),
+            'busy': self.busy,
+            'pending': self.pending,
+            'stuck': sum(1 for worker in self.workers
+                         if worker.started and now - worker.started >= EXTRACTION_STUCK_AFTER),
+            'timeouts': dict(self.timeouts),
+            'cancelled': self.cancelled,
+            'replaced': self.replaced
+        }
+
+extraction_pool = ExtractionPool()
@@ -0,0 +1,292 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from config.config import (
+    FFMPEG_MAX_PROCESSES, FFMPEG_NICE, FFMPEG_IONICE_CLASS, FFMPEG_IONICE_LEVEL,
+    FFMPEG_REAP_INTERVAL, FFMPEG_REPORT_INTERVAL
+)
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def read_usage(pid):
+    """(CPU seconds, RSS bytes) of a process from /proc, or None where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the command name, which may itself contain spaces
+            fields = f.read().rpartition(')')[2].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    # utime and stime are fields 14 and 15 of the full line
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss_pages * PAGE_SIZE
+
+class ManagedProcess:
+    """An ffmpeg child the supervisor tracks"""
+
+    def __init__(self, process, guild_id, source=None):
+        self.process = process
+        self.guild_id = guild_id
+        # Source that spawned it; shared sources report the guilds they serve
+        self.source = source
+        self.started = time.monotonic()
+        # Last (wall time, CPU seconds) sample, for CPU usage between reports
+        self.sample = (self.started, 0.0)
+
+    def usage(self):
+        """Current CPU share since the last call and RSS in bytes"""
+        usage = read_usage(self.process.pid)
+        if usage is None:
+            return None, None
+        cpu_seconds, rss = usage
+        now = time.monotonic()
+        last_time, last_cpu = self.sample
+        self.sample = (now, cpu_seconds)
+        cpu = (cpu_seconds - last_cpu) / (now - last_time) if now > last_time else 0.0
+        return cpu, rss
+
+    def guild_ids(self):
+        """Guilds the process plays for, or None if it belongs to none (e.g. analysis)"""
+        if self.guild_id is not None:
+            return {self.guild_id}
+        guild_ids = getattr(self.source, 'guild_ids', None)
+        return guild_ids() if guild_ids else None
+
+class FFmpegSupervisor:
+    """Tracks every ffmpeg process the bot spawns.
+
+    Every spawn takes a slot() first, so at most FFMPEG_MAX_PROCESSES run
+    at once in this process and the rest wait in line; the cluster launcher
+    divides the cap among its processes. Background work (loudness analysis)
+    only gets a slot while no playback is waiting. Playback runs at
+    FFMPEG_NICE and, where ionice exists, a low I/O priority so a busy host
+    stays responsive. A reaper collects exited processes and kills those
+    whose guilds no longer have a voice client.
+    """
+
+    def __init__(self, max_processes=FFMPEG_MAX_PROCESSES, nice=FFMPEG_NICE,
+                 ionice_class=FFMPEG_IONICE_CLASS, ionice_level=FFMPEG_IONICE_LEVEL):
+        self.max_processes = max_processes
+        self.nice = nice
+        self.prefix = []
+        ionice = shutil.which('ionice')
+        if ionice and ionice_class:
+            # ionice execs ffmpeg in place, so the PID stays the one Popen returned
+            self.prefix = [ionice, '-c', str(ionice_class)]
+            if ionice_class == 2:
+                self.prefix += ['-n', str(ionice_level)]
+        # Sources are cleaned up from discord.py's player threads too
+        self.lock = threading.Lock()
+        # pid -> ManagedProcess
+        self.processes = {}
+        # Slots handed out but not yet filled by a process
+        self.reserved = 0
+        self.waiters = deque()
+        # Background spawns, served once no playback is waiting
+        self.background = deque()
+        self.loop = None
+        self.task = None
+        self.spawned = 0
+        self.queued = 0
+        self.reaped = 0
+        self.orphans_killed = 0
+        self.peak = 0
+
+    def _has_capacity(self):
+        return not self.max_processes or len(self.processes) + self.reserved < self.max_processes
+
+    def _wake(self):
+        """Hand free slots to the longest waiting spawns, playback first"""
+        for queue in (self.waiters, self.background):
+            while queue and self._has_capacity():
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self.reserved += 1
+                    waiter.set_result(None)
+
+    def _notify(self):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._wake)
+
+    @asynccontextmanager
+    async def slot(self, background=False, timeout=None):
+        """Wait for a free slot, then spawn the process inside the block.
+
+        Background slots also wait for every playback spawn queued before or
+        after them. Raises asyncio.TimeoutError after timeout seconds in line.
+        """
+        self.loop = asyncio.get_running_loop()
+        queue = self.background if background else self.waiters
+        if self.waiters or queue or not self._has_capacity():
+            waiter = self.loop.create_future()
+            queue.append(waiter)
+            self.queued += 1
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                if waiter.done() and not waiter.cancelled():
+                    # Granted just as we were cancelled; pass it on
+                    self.reserved -= 1
+                    self._wake()
+                elif waiter in queue:
+                    queue.remove(waiter)
+                raise
+        else:
+            self.reserved += 1
+        try:
+            yield
+        finally:
+            # The spawned process now holds the slot, or it failed to spawn
+            self.reserved -= 1
+            self._wake()
+
+    def command(self, args):
+        """ffmpeg's arguments with the I/O priority wrapper in front"""
+        return self.prefix + list(args)
+
+    def track(self, process, guild_id=None, source=None, nice=None):
+        """Register a freshly spawned process and lower its CPU priority (FFMPEG_NICE by default)"""
+        nice = self.nice if nice is None else nice
+        if nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, process.pid, nice)
+            except (AttributeError, OSError) as e:
+                print(f"Could not renice ffmpeg process {process.pid}: {str(e)}")
+        with self.lock:
+            self.processes[process.pid] = ManagedProcess(process, guild_id, source)
+            self.spawned += 1
+            self.peak = max(self.peak, len(self.processes))
+
+    def untrack(self, process):
+        """Forget a process once it has been killed and waited for"""
+        with self.lock:
+            removed = self.processes.pop(process.pid, None)
+        if removed:
+            self._notify()
+
+    def kill_guild(self, guild_id):
+        """Kill every process spawned for a guild"""
+        with self.lock:
+            managed = [m for m in self.processes.values() if m.guild_id == guild_id]
+        for m in managed:
+            self._kill(m)
+        return len(managed)
+
+    def _kill(self, managed):
+        process = managed.process
+        try:
+            process.kill()
+            process.wait(timeout=5)
+        except Exception as e:
+            print(f"Error killing ffmpeg process {process.pid}: {str(e)}")
+            return
+        self.untrack(process)
+
+    def start(self, bot):
+        """Start reaping exited and orphaned processes on the bot's loop"""
+        self.loop = bot.loop
+        if self.task is None or self.task.done():
+            self.task = bot.loop.create_task(self._reap_loop(bot))
+
+    def reap(self, bot):
+        """Collect exited processes and kill those whose guilds all left voice"""
+        with self.lock:
+            managed = list(self.processes.values())
+        for m in managed:
+            # poll() also waits for an exited child, so it does not linger as a zombie
+            if m.process.poll() is not None:
+                self.reaped += 1
+                self.untrack(m.process)
+                continue
+            guild_ids = m.guild_ids()
+            if guild_ids is None:
+                continue
+            if not any(self._in_voice(bot, guild_id) for guild_id in guild_ids):
+                print(f"Killing orphaned ffmpeg process {m.process.pid} of guilds {sorted(guild_ids)}")
+                self.orphans_killed += 1
+                self._kill(m)
+
+    @staticmethod
+    def _in_voice(bot, guild_id):
+        guild = bot.get_guild(guild_id)
+        return guild is not None and guild.voice_client is not None
+
+    def report(self):
+        stats = self.stats()
+        print(f"ffmpeg: {stats['running']} running, {stats['waiting']} waiting, "
+              f"{stats['orphans_killed']} orphans killed, {stats['reaped']} reaped")
+        for process in stats['processes']:
+            cpu = 'n/a' if process['cpu'] is None else f"{process['cpu']:.1%}"
+            rss = 'n/a' if process['rss'] is None else f"{process['rss'] / 1024 ** 2:.1f} MB"
+            print(f"- pid {process['pid']} guild {process['guild_id']}: "
+                  f"up {process['age']:.0f}s, CPU {cpu}, RSS {rss}")
+
+    async def _reap_loop(self, bot):
+        next_report = time.monotonic() + FFMPEG_REPORT_INTERVAL
+        while True:
+            await asyncio.sleep(FFMPEG_REAP_INTERVAL)
+            try:
+                self.reap(bot)
+                if FFMPEG_REPORT_INTERVAL and time.monotonic() >= next_report and self.processes:
+                    self.report()
+                    next_report = time.monotonic() + FFMPEG_REPORT_INTERVAL
+            except Exception as e:
+                print(f"Error reaping ffmpeg processes: {str(e)}")
+
+    def stats(self):
+        with self.lock:
+            managed = list(self.processes.values())
+        now = time.monotonic()
+        processes = []
+        for m in managed:
+            cpu, rss = m.usage()
+            processes.append({
+                'pid': m.process.pid,
+                'guild_id': m.guild_id,
+                'age': now - m.started,
+                'cpu': cpu,
+                'rss': rss
+            })
+        return {
+            'running': len(managed),
+            'waiting': len(self.waiters),
+            'background_waiting': len(self.background),
+            'max': self.max_processes,
+            'peak': self.peak,
+            'spawned': self.spawned,
+            'queued': self.queued,
+            'reaped': self.reaped,
+            'orphans_killed': self.orphans_killed,
+            'cpu': sum(p['cpu'] or 0 for p in processes),
+            'rss': sum(p['rss'] or 0 for p in processes),
+            'processes': processes
+        }
+
+class SupervisedFFmpeg:
+    """Mixin for discord.py FFmpeg sources that spawns through the supervisor.
+
+    Set guild_id before FFmpegAudio.__init__ runs so orphans can be traced
+    back to their guild. Sources shared by several guilds leave it None
+    and set a guild_ids() method instead.
+    """
+
+    guild_id = None
+
+    def _spawn_process(self, args, **subprocess_kwargs):
+        process = super()._spawn_process(ffmpeg_supervisor.command(args), **subprocess_kwargs)
+        ffmpeg_supervisor.track(process, self.guild_id, source=self)
+        return process
+
+    def _kill_process(self):
+        process = self._process
+        super()._kill_process()
+        if process:
+            ffmpeg_supervisor.untrack(process)
+
+# Shared by every player on this process
+ffmpeg_supervisor = FFmpegSupervisor()
@@ -0,0 +1,29 @@
+import discord
+from config.config import GATEWAY_MODE, GATEWAY_MAX_MESSAGES
+
+def lean_intents():
+    """The events a music bot reads: guilds, voice states and command messages"""
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.voice_states = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return intents
+
+def client_options(mode=GATEWAY_MODE):
+    """Keyword arguments for the bot's client in the given gateway mode"""
+    if mode == 'full':
+        return {'intents': discord.Intents.all()}
+    if mode != 'lean':
+        raise ValueError(f"Unknown gateway mode: {mode}")
+
+    # Members are only needed while they are in a voice channel
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    return {
+        'intents': lean_intents(),
+        'member_cache_flags': member_cache_flags,
+        # Without the members intent there is nothing to chunk
+        'chunk_guilds_at_startup': False,
+        'max_messages': GATEWAY_MAX_MESSAGES or None
+    }
@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from config.config import (
+    HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY, HEDGE_MAX_DELAY,
+    HEDGE_MIN_SAMPLES, HEDGE_WINDOW
+)
+
+# State of the backend call being timed in the current task; tasks it
+# starts (e.g. a shared extraction) see the same dict
+_timing = contextvars.ContextVar('hedge_timing', default=None)
+
+def note_upstream():
+    """Mark the timed call as having gone past every cache to the backend itself"""
+    timing = _timing.get()
+    if timing is not None:
+        timing['upstream'] = True
+
+class LatencyHistogram:
+    """Latencies of the most recent requests to one backend"""
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """Latency under which pct percent of recent requests finished, or None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(pct / 100 * len(ordered)))
+        return ordered[index]
+
+    def stats(self):
+        return {
+            'samples': len(self.samples),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99)
+        }
+
+class Hedger:
+    """Race a secondary backend against a slow primary.
+
+    The primary runs alone until it takes longer than its own recent
+    HEDGE_PERCENTILE latency (over calls that called note_upstream()); then the secondary starts too, the first
+    success wins and the other is cancelled. A failed primary also falls
+    back to the secondary. can_hedge() is asked before a slow primary is
+    hedged, so hedges do not pile onto an overloaded backend.
+    """
+
+    def __init__(self, primary='primary', secondary='secondary', can_hedge=None):
+        self.names = (primary, secondary)
+        self.can_hedge = can_hedge
+        self.histograms = {primary: LatencyHistogram(), secondary: LatencyHistogram()}
+        self.requests = 0
+        self.hedged = 0
+        # Slow primaries left alone because there was no spare capacity
+        self.skipped = 0
+        self.secondary_wins = 0
+
+    def delay(self):
+        """Seconds to give the primary before hedging"""
+        histogram = self.histograms[self.names[0]]
+        if len(histogram.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, histogram.percentile(HEDGE_PERCENTILE)))
+
+    async def _timed(self, name, func):
+        start = time.monotonic()
+        timing = {'upstream': False}
+        _timing.set(timing)
+        try:
+            return await func()
+        finally:
+            # Cache hits would pull the hedge delay down, so only calls that
+            # reached the backend count. Cancelled losers are recorded too,
+            # or slow requests would drop out and shrink the delay
+            if timing['upstream']:
+                self.histograms[name].record(time.monotonic() - start)
+
+    async def run(self, primary, secondary):
+        """Return (result, backend name) from the first of primary() and secondary() to succeed"""
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        tasks = [loop.create_task(self._timed(self.names[0], primary))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay())
+            if done and tasks[0].exception() is None:
+                return tasks[0].result(), self.names[0]
+            if not done and self.can_hedge and not self.can_hedge():
+                self.skipped += 1
+                return await tasks[0], self.names[0]
+
+            self.hedged += 1
+            tasks.append(loop.create_task(self._timed(self.names[1], secondary)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self.secondary_wins += 1
+                        return task.result(), self.names[tasks.index(task)]
+            # Both failed; the primary's error is the one worth showing
+            raise tasks[0].exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'skipped': self.skipped,
+            'secondary_wins': self.secondary_wins,
+            'delay': self.delay(),
+            **{f"{name}_latency": histogram.stats() for name, histogram in self.histograms.items()}
+        }
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from config.config import (
+    LOUDNESS_ENABLED, LOUDNESS_DB_PATH, LOUDNESS_TARGET, LOUDNESS_MAX_BOOST_DB, LOUDNESS_MAX_CUT_DB,
+    LOUDNESS_PEAK_CEILING, LOUDNESS_TOLERANCE_DB, LOUDNESS_WORKERS, LOUDNESS_MAX_PENDING,
+    LOUDNESS_MAX_DURATION, LOUDNESS_TIMEOUT, LOUDNESS_SLOT_TIMEOUT
+)
+from utils.audio_cache import audio_cache
+from utils.ffmpeg_supervisor import ffmpeg_supervisor
+
+# Lowest CPU priority for analysis, below playback's FFMPEG_NICE
+ANALYSIS_NICE = 19
+INTEGRATED_REGEX = r'I:\s+(-?[\d.]+) LUFS'
+PEAK_REGEX = r'Peak:\s+(-?[\d.]+|-inf) dBFS'
+
+def spawn_analysis(path):
+    """Start an ebur128 pass over a file; the ffmpeg supervisor tracks it"""
+    command = ['ffmpeg', '-hide_banner', '-nostats', '-threads', '1']
+    command += ['-i', path, '-vn', '-af', 'ebur128=peak=true:framelog=quiet', '-f', 'null', '-']
+    ionice = shutil.which('ionice')
+    if ionice:
+        # Idle class: only reads the disk when nothing else wants to
+        command = [ionice, '-c', '3'] + command
+
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    ffmpeg_supervisor.track(process, nice=ANALYSIS_NICE)
+    return process
+
+def read_analysis(process, timeout=LOUDNESS_TIMEOUT):
+    """Wait for an analysis and return integrated loudness (LUFS) and true peak (dBFS)"""
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise TimeoutError(f"loudness analysis took over {timeout}s")
+    finally:
+        ffmpeg_supervisor.untrack(process)
+
+    # The summary comes last; earlier matches would be per-frame logs
+    integrated = re.findall(INTEGRATED_REGEX, stderr)
+    peak = re.findall(PEAK_REGEX, stderr)
+    if process.returncode != 0 or not integrated:
+        raise ValueError(f"ffmpeg exited with {process.returncode}: {stderr.strip()[-200:]}")
+    return float(integrated[-1]), float(peak[-1]) if peak and peak[-1] != '-inf' else None
+
+def gain_for(lufs, peak, target=LOUDNESS_TARGET):
+    """Linear gain that brings a track to target loudness without pushing its peak past the ceiling"""
+    gain_db = min(LOUDNESS_MAX_BOOST_DB, max(-LOUDNESS_MAX_CUT_DB, target - lufs))
+    if peak is not None:
+        gain_db = min(gain_db, LOUDNESS_PEAK_CEILING - peak)
+    if abs(gain_db) < LOUDNESS_TOLERANCE_DB:
+        # Leave close tracks alone, so Opus streams can still be copied untouched
+        return 1.0
+    return 10 ** (gain_db / 20)
+
+class LoudnessIndex:
+    """Loudness of every video played, measured once and kept on disk.
+
+    The first play of a video queues an ebur128 pass over its cached file,
+    so analysis never downloads a stream a second time; if the first play
+    is still filling the cache, the pass waits for the fill to land. Videos
+    that cannot be cached are not analyzed. Later plays look the result up
+    and apply it as a static gain on the source's volume, so no loudnorm
+    filter runs while streaming. At most LOUDNESS_WORKERS analyses run at
+    once, each in a background ffmpeg_supervisor slot that playback always
+    goes ahead of (for up to LOUDNESS_SLOT_TIMEOUT seconds), with ffmpeg at
+    the lowest CPU and I/O priority.
+    """
+
+    def __init__(self, path=LOUDNESS_DB_PATH, enabled=LOUDNESS_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.conn = None
+        # video_id -> gain, for videos looked up this session
+        self.gains = {}
+        self.pending = set()
+        # video_id -> deadline, for analyses waiting on a cache fill
+        self.awaiting_fill = {}
+        self.loop = None
+        self.workers = None
+        # Running analyses; the loop only keeps weak references to tasks
+        self.tasks = set()
+        self.analyzed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.timed_out = 0
+        audio_cache.on_fill.append(self._filled)
+
+    def _connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS loudness (
+                    video_id TEXT PRIMARY KEY,
+                    integrated REAL NOT NULL,
+                    peak REAL,
+                    analyzed_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def get(self, video_id):
+        """Get (integrated LUFS, true peak dBFS) for a video, or None"""
+        with self.lock:
+            try:
+                return self._connect().execute(
+                    "SELECT integrated, peak FROM loudness WHERE video_id = ?", (video_id,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading loudness index: {str(e)}")
+                return None
+
+    def put(self, video_id, integrated, peak):
+        with self.lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO loudness (video_id, integrated, peak, analyzed_at) VALUES (?, ?, ?, ?)",
+                    (video_id, integrated, peak, time.time())
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing loudness index: {str(e)}")
+
+    def _lookup(self, video_id):
+        measured = self.get(video_id)
+        if measured is None:
+            return None
+        return gain_for(*measured)
+
+    async def gain(self, data, *, loop):
+        """Gain for extracted info; unknown videos play at 1.0 and are queued for analysis"""
+        video_id = data.get('id')
+        if not self.enabled or not audio_cache.enabled or not video_id:
+            return 1.0
+        if video_id in self.gains:
+            return self.gains[video_id]
+
+        gain = await loop.run_in_executor(None, self._lookup, video_id)
+        if gain is None:
+            self.schedule(data, loop=loop)
+            return 1.0
+        self.gains[video_id] = gain
+        return gain
+
+    def schedule(self, data, *, loop):
+        """Queue a loudness analysis for a video played for the first time"""
+        video_id = data['id']
+        if data.get('is_live') or (data.get('duration') or 0) > LOUDNESS_MAX_DURATION:
+            return
+        cached = audio_cache.path(video_id) is not None
+        if not cached and not audio_cache.should_fill(data):
+            return
+        self.loop = loop
+        now = time.monotonic()
+        with self.lock:
+            # Fills that never started or never reported back
+            for stale in [v for v, deadline in self.awaiting_fill.items() if deadline < now]:
+                del self.awaiting_fill[stale]
+                self.pending.discard(stale)
+                self.timed_out += 1
+            if video_id in self.pending:
+                return
+            if len(self.pending) >= LOUDNESS_MAX_PENDING:
+                self.dropped += 1
+                return
+            self.pending.add(video_id)
+            if not cached:
+                # The first play's cache fill starts it, unless it landed since the check above
+                self.awaiting_fill[video_id] = now + LOUDNESS_TIMEOUT
+                if audio_cache.path(video_id) is None:
+                    return
+                del self.awaiting_fill[video_id]
+        self._start(video_id)
+
+    def _filled(self, video_id, path):
+        """Audio cache callback, on the fill thread"""
+        with self.lock:
+            if self.awaiting_fill.pop(video_id, None) is None:
+                return
+            if path is None:
+                self.pending.discard(video_id)
+                return
+        self.loop.call_soon_threadsafe(self._start, video_id)
+
+    def _start(self, video_id):
+        if self.workers is None:
+            self.workers = asyncio.Semaphore(LOUDNESS_WORKERS)
+        task = self.loop.create_task(self._analyze(video_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _analyze(self, video_id):
+        try:
+            async with self.workers:
+                async with ffmpeg_supervisor.slot(background=True, timeout=LOUDNESS_SLOT_TIMEOUT):
+                    # Checked now rather than when queued; the file may have been evicted meanwhile
+                    path = audio_cache.path(video_id)
+                    if not path:
+                        return
+                    process = spawn_analysis(path)
+                integrated, peak = await self.loop.run_in_executor(None, read_analysis, process)
+            await self.loop.run_in_executor(None, self.put, video_id, integrated, peak)
+            self.gains[video_id] = gain_for(integrated, peak)
+            self.analyzed += 1
+            print(f"Loudness of {video_id}: {integrated:.1f} LUFS, peak {peak} dBFS")
+        except asyncio.TimeoutError:
+            # Playback kept every slot busy, or ffmpeg ran too long; the next play queues it again
+            self.timed_out += 1
+            print(f"Loudness analysis of {video_id} timed out")
+        except Exception as e:
+            self.failed += 1
+            print(f"Error analyzing loudness of {video_id}: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending.discard(video_id)
+
+    def stats(self):
+        return {
+            'known': len(self.gains),
+            'pending': len(self.pending),
+            'analyzed': self.analyzed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'timed_out': self.timed_out
+        }
+
+loudness_index = LoudnessIndex()
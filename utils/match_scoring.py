@@ -0,0 +1,81 @@
+import re
+from config.config import MATCH_DURATION_TOLERANCE
+
+# Words that say nothing about which recording a video is
+NOISE_WORDS = {
+    'official', 'audio', 'video', 'music', 'lyrics', 'lyric', 'visualizer',
+    'hd', 'hq', '4k', 'ft', 'feat', 'the', 'a', 'and', 'x', 'topic', 'vevo'
+}
+# Words that mark a different version than the studio recording
+VERSION_WORDS = {
+    'live', 'cover', 'remix', 'karaoke', 'instrumental', 'acoustic', 'reaction',
+    'slowed', 'reverb', 'sped', 'nightcore', '8d', 'loop', 'hour', 'hours', 'mashup'
+}
+
+# How much each signal counts towards the final score
+WEIGHTS = {
+    'duration': 0.45,
+    'title': 0.25,
+    'artist': 0.15,
+    'channel': 0.15
+}
+VERSION_PENALTY = 0.5
+
+def tokenize(text):
+    """Lowercase word tokens of a title, artist or channel name"""
+    return set(re.findall(r'\w+', (text or '').lower())) - NOISE_WORDS
+
+def duration_score(duration, expected):
+    """1.0 for a matching length, falling to 0 at MATCH_DURATION_TOLERANCE seconds off"""
+    if not duration or not expected:
+        return 0.5
+    delta = abs(duration - expected)
+    if delta <= 3:
+        return 1.0
+    return max(0.0, 1 - delta / MATCH_DURATION_TOLERANCE)
+
+def overlap(expected, found):
+    """Share of the expected tokens that appear in found"""
+    if not expected:
+        return 0.0
+    return len(expected & found) / len(expected)
+
+def channel_score(channel, artist_tokens):
+    """Auto-generated "Topic" channels carry the studio audio; artist channels come next"""
+    channel = channel or ''
+    if channel.endswith(' - Topic'):
+        return 1.0
+    lowered = channel.lower()
+    if 'vevo' in lowered or (artist_tokens and artist_tokens <= tokenize(channel)):
+        return 0.7
+    if 'official' in lowered:
+        return 0.5
+    return 0.0
+
+def score_candidate(candidate, track):
+    """Score how likely a flat search result is the Spotify track, higher is better"""
+    title_tokens = set(re.findall(r'\w+', (candidate.get('title') or '').lower()))
+    channel_tokens = tokenize(candidate.get('channel'))
+    name_tokens = tokenize(track['track_name'])
+    artist_tokens = tokenize(track['artists'])
+
+    score = (
+        WEIGHTS['duration'] * duration_score(candidate.get('duration'), track['duration_ms'] / 1000)
+        + WEIGHTS['title'] * overlap(name_tokens, title_tokens)
+        + WEIGHTS['artist'] * overlap(artist_tokens, title_tokens | channel_tokens)
+        + WEIGHTS['channel'] * channel_score(candidate.get('channel'), artist_tokens)
+    )
+
+    # A live or remixed upload only fits if the track itself is that version
+    if (title_tokens & VERSION_WORDS) - set(re.findall(r'\w+', track['track_name'].lower())):
+        score -= VERSION_PENALTY
+    return score
+
+def pick_best(candidates, track):
+    """Return (candidate, score) for the best match, or (None, None) without candidates"""
+    best, best_score = None, None
+    for candidate in candidates:
+        score = score_candidate(candidate, track)
+        if best_score is None or score > best_score:
+            best, best_score = candidate, score
+    return best, best_score
@@ -0,0 +1,376 @@
+import asyncio
+import discord
+from utils.youtube_handler import YTDLSource, create_source, is_search, watch_url
+from utils.rate_limit import ExtractionUnavailable, classify_error, NOT_FOUND, PERMANENT
+from utils.track_index import track_index
+from utils.match_scoring import pick_best
+from utils.extraction_pool import ExtractionError
+from utils.ffmpeg_supervisor import ffmpeg_supervisor
+from utils.loudness import loudness_index
+from utils.broadcast import broadcast_hub
+from config.config import PLAYER_QUEUE_SIZE, PLAYER_PREFETCH_TRACKS, PLAYBACK_VOLUME, BROADCAST_ENABLED
+
+# Active players keyed by guild ID
+players = {}
+
+def get_player(bot, guild, channel):
+    """Get the guild's player, creating it on first use"""
+    player = players.get(guild.id)
+    if player is None:
+        player = GuildPlayer(bot, guild, channel)
+        players[guild.id] = player
+    else:
+        # Announce in the channel the latest command came from
+        player.channel = channel
+    return player
+
+def create_now_playing_embed(source, entry):
+    """Build the "now playing" embed for a queue entry"""
+    track_info = entry.get('track_info')
+    if track_info:
+        title = "🎵 جاري التشغيل من قائمة Spotify" if entry.get('playlist_name') else "🎵 جاري التشغيل من Spotify"
+        embed = discord.Embed(
+            title=title,
+            description=f"**{track_info['track_name']}**\nبواسطة {track_info['artists']}",
+            color=discord.Color.green()
+        )
+
+        if track_info['album_art']:
+            embed.set_thumbnail(url=track_info['album_art'])
+
+        embed.add_field(name="الألبوم", value=track_info['album_name'], inline=True)
+        minutes = track_info['duration_ms'] // 60000
+        seconds = (track_info['duration_ms'] % 60000) // 1000
+        embed.add_field(name="المدة", value=f"{minutes}:{seconds:02d}", inline=True)
+
+        if entry.get('playlist_name'):
+            embed.set_footer(text=f"المقطع {entry['position']} من {entry['total']} | {entry['playlist_name']}")
+        return embed
+
+    embed = discord.Embed(
+        title="🎵 جاري التشغيل",
+        description=f"**{source.title}**",
+        color=discord.Color.green()
+    )
+
+    if source.thumbnail:
+        embed.set_thumbnail(url=source.thumbnail)
+
+    if source.duration:
+        minutes = int(source.duration) // 60
+        seconds = int(source.duration) % 60
+        embed.add_field(name="المدة", value=f"{minutes}:{seconds:02d}", inline=True)
+
+    if source.webpage_url:
+        embed.add_field(name="الرابط", value=f"[YouTube]({source.webpage_url})", inline=True)
+    return embed
+
+class GuildPlayer:
+    """Per-guild track queue that plays entries back to back.
+
+    While a track plays, the next queued entry is already resolved and its
+    FFmpeg source spawned, so advancing is a source swap instead of a
+    full yt-dlp round trip. Entries further back are only resolved once
+    they are within PLAYER_PREFETCH_TRACKS of the play head.
+    """
+
+    def __init__(self, bot, guild, channel):
+        self.bot = bot
+        self.guild = guild
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=PLAYER_QUEUE_SIZE)
+        self.next = asyncio.Event()
+        self.current = None
+        # (entry, task) for the entry being resolved ahead of time
+        self.upcoming = None
+        self.closed = False
+        # Background tasks feeding streamed playlists into the queue
+        self.ingest_tasks = set()
+        # Audio settings applied to every source this player builds
+        self.volume = PLAYBACK_VOLUME
+        self.preset = None
+        self.task = bot.loop.create_task(self.player_loop())
+
+    def is_idle(self):
+        """Whether nothing is playing, prefetched or waiting in the queue"""
+        return self.current is None and self.upcoming is None and self.queue.empty()
+
+    def add(self, entry):
+        """Queue an entry and return its position in line.
+
+        Raises asyncio.QueueFull when the guild's queue is full.
+        """
+        self.queue.put_nowait(entry)
+        return self.queue.qsize() + (1 if self.upcoming else 0)
+
+    def ingest(self, entries):
+        """Feed an async iterable of entries into the queue in the background"""
+        task = self.bot.loop.create_task(self._ingest(entries))
+        self.ingest_tasks.add(task)
+        task.add_done_callback(self.ingest_tasks.discard)
+
+    async def _ingest(self, entries):
+        try:
+            async for entry in entries:
+                # Waits while the queue is full, which also pauses page fetching
+                await self.queue.put(entry)
+        except Exception as e:
+            print(f"Error queueing playlist: {str(e)}")
+        finally:
+            await entries.aclose()
+
+    def pending(self):
+        """Entries waiting to be played, in order"""
+        entries = [self.upcoming[0]] if self.upcoming else []
+        return entries + list(self.queue._queue)
+
+    async def identify(self, entry):
+        """Find the video a search entry refers to without extracting its formats.
+
+        Spotify tracks are matched by scoring every candidate of the search
+        against the track's length, title and artists; plain searches keep
+        YouTube's top result. Returns False when the search found nothing.
+        """
+        if entry.get('video_id') or not is_search(entry['query']):
+            return True
+        candidates = await YTDLSource.search(entry['query'], loop=self.bot.loop, guild_id=self.guild.id)
+        if not candidates:
+            return False
+
+        track_info = entry.get('track_info')
+        if track_info:
+            match, score = pick_best(candidates, track_info)
+            print(f"Matched {track_info['track_name']} to {match['title']} (score {score:.2f})")
+        else:
+            match = candidates[0]
+            if match['title']:
+                entry['title'] = match['title']
+        entry['video_id'] = match['id']
+        entry['duration'] = match['duration']
+        return True
+
+    async def resolve_data(self, entry, hedge=False):
+        """Resolve a queue entry to its extracted info; hedge only when someone is waiting on it"""
+        if not is_search(entry['query']):
+            return await self._resolve_youtube(entry)
+
+        track_info = entry.get('track_info')
+        # Other backends do better with the bare title than the YouTube-tuned query
+        query = f"{track_info['artists']} {track_info['track_name']}" if track_info else entry['query']
+        return await YTDLSource.resolve_search(query, lambda: self._resolve_youtube(entry),
+                                               guild_id=self.guild.id, hedge=hedge)
+
+    async def _resolve_youtube(self, entry):
+        track_info = entry.get('track_info') or {}
+        spotify_id = track_info.get('spotify_id')
+        indexed = None
+
+        if spotify_id and not entry.get('video_id'):
+            # Skip the YouTube search for Spotify tracks we have matched before
+            indexed = await track_index.lookup(spotify_id, loop=self.bot.loop)
+            if indexed:
+                entry['video_id'] = indexed['video_id']
+
+        while True:
+            if not await self.identify(entry):
+                raise ExtractionError(f"No results found for {entry['query']}")
+
+            query = watch_url(entry['video_id']) if entry.get('video_id') else entry['query']
+            try:
+                data, _ = await YTDLSource.get_data(query, loop=self.bot.loop, stream=True, guild_id=self.guild.id)
+                break
+            except ExtractionUnavailable:
+                raise
+            except Exception as e:
+                if not indexed or classify_error(e) not in (NOT_FOUND, PERMANENT):
+                    raise
+                # The indexed video was removed or made private; match the track again
+                print(f"Indexed video {entry['video_id']} for {spotify_id} is gone, searching again")
+                await track_index.forget(spotify_id, loop=self.bot.loop)
+                indexed = None
+                entry.pop('video_id', None)
+
+        if spotify_id and not indexed:
+            # Keep the winning match so later plays skip search and scoring
+            await track_index.store(spotify_id, data['id'], data.get('duration'), loop=self.bot.loop)
+        return data
+
+    def warm(self, entry, hedge=False):
+        """Start resolving an entry's info, or return the resolve already running"""
+        if 'resolving' not in entry:
+            entry['resolving'] = self.bot.loop.create_task(self.resolve_data(entry, hedge=hedge))
+        return entry['resolving']
+
+    async def resolve(self, entry, hedge=False):
+        """Turn a queue entry into a ready-to-play audio source"""
+        data = await self.warm(entry, hedge=hedge)
+        # Measured once per video; the first play queues the analysis and plays as is
+        gain = await loudness_index.gain(data, loop=self.bot.loop)
+        if BROADCAST_ENABLED and not self.preset:
+            # Guilds playing the same track at the same volume share one ffmpeg and Opus encode
+            listener = broadcast_hub.join(data, self.volume * gain, self.guild.id)
+            if listener:
+                return listener
+            async with ffmpeg_supervisor.slot():
+                return broadcast_hub.start(data, self.volume * gain, self.guild.id)
+        # Waits here while the host is at its ffmpeg cap
+        async with ffmpeg_supervisor.slot():
+            return create_source(data, volume=self.volume, guild_id=self.guild.id, preset=self.preset, gain=gain)
+
+    async def prefetch_next(self):
+        """Resolve the next queued entry while the current one plays"""
+        entry = await self.queue.get()
+        self.upcoming = (entry, self.bot.loop.create_task(self.resolve(entry)))
+
+        # Look up info (but spawn nothing) for the entries right behind it
+        for queued in list(self.queue._queue)[:PLAYER_PREFETCH_TRACKS - 1]:
+            self.warm(queued)
+
+    async def announce(self, entry, source):
+        """Post the now playing embed, reusing the command's status message if any"""
+        embed = create_now_playing_embed(source, entry)
+        message = entry.pop('message', None)
+        try:
+            if message:
+                await message.edit(content=None, embed=embed)
+            else:
+                await self.channel.send(embed=embed)
+        except discord.HTTPException as e:
+            print(f"Error sending now playing message: {str(e)}")
+
+    async def player_loop(self):
+        """Play queued entries until the player is destroyed"""
+        await self.bot.wait_until_ready()
+
+        while True:
+            self.next.clear()
+
+            if self.upcoming is None:
+                entry = await self.queue.get()
+                # Nothing was prefetched, so the user is waiting on this one
+                self.upcoming = (entry, self.bot.loop.create_task(self.resolve(entry, hedge=True)))
+
+            entry, task = self.upcoming
+            if task.done() and not task.cancelled() and task.exception() is None \
+                    and getattr(task.result(), 'expired', False):
+                # Prefetched into a broadcast that has since moved past the track's start
+                await self.release(task.result())
+                task = self.bot.loop.create_task(self.resolve(entry))
+                self.upcoming = (entry, task)
+            try:
+                source = await task
+            except asyncio.CancelledError:
+                if not self.closed and self.upcoming is None:
+                    # Prefetch was discarded by clear(), move on
+                    continue
+                raise
+            except Exception as e:
+                self.upcoming = None
+                print(f"Error preparing track: {str(e)}")
+                message = entry.pop('message', None)
+                if isinstance(e, ExtractionUnavailable):
+                    error_msg = f"❌ {str(e)}"
+                else:
+                    error_msg = f"❌ حدث خطأ أثناء تشغيل المقطع: {str(e)}"
+                try:
+                    if message:
+                        await message.edit(content=error_msg)
+                    else:
+                        await self.channel.send(error_msg)
+                except discord.HTTPException as e:
+                    print(f"Error sending track error message: {str(e)}")
+                continue
+            self.upcoming = None
+
+            voice_client = self.guild.voice_client
+            if not voice_client or not voice_client.is_connected():
+                await self.release(source)
+                return await self.destroy()
+
+            self.current = (entry, source)
+            voice_client.play(source, after=self._after_playback)
+            await self.announce(entry, source)
+
+            prefetch = self.bot.loop.create_task(self.prefetch_next())
+            await self.next.wait()
+            if not prefetch.done():
+                prefetch.cancel()
+
+            self.current = None
+            await self.release(source)
+
+    def sources(self):
+        """The playing source and the prefetched one, if any"""
+        sources = [self.current[1]] if self.current else []
+        if self.upcoming and self.upcoming[1].done() and not self.upcoming[1].cancelled() \
+                and self.upcoming[1].exception() is None:
+            sources.append(self.upcoming[1].result())
+        return sources
+
+    def set_volume(self, volume):
+        """Change volume for later tracks; returns whether the playing track follows too"""
+        self.volume = volume
+        playing = self.current[1] if self.current else None
+        for source in self.sources():
+            if isinstance(source, YTDLSource):
+                source.set_volume(volume)
+        return isinstance(playing, YTDLSource)
+
+    def set_preset(self, preset):
+        """Change EQ preset for later tracks; returns whether the playing track follows too"""
+        self.preset = preset
+        playing = self.current[1] if self.current else None
+        live = False
+        for source in self.sources():
+            if isinstance(source, YTDLSource) and source.set_preset(preset):
+                live = live or source is playing
+        return live
+
+    def release(self, source):
+        """Clean up a source in the executor; it may wait seconds for a reader thread"""
+        return self.bot.loop.run_in_executor(None, source.cleanup)
+
+    def _after_playback(self, error):
+        """Called from discord.py's player thread when a track ends"""
+        if error:
+            print(f'Player error: {error}')
+        self.bot.loop.call_soon_threadsafe(self.next.set)
+
+    def _discard_upcoming(self):
+        """Drop the prefetched entry and release its FFmpeg process"""
+        if self.upcoming is None:
+            return
+        entry, task = self.upcoming
+        self.upcoming = None
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            self.release(task.result())
+
+    def clear(self):
+        """Empty the queue and drop any prefetched track"""
+        for task in list(self.ingest_tasks):
+            task.cancel()
+        while not self.queue.empty():
+            entry = self.queue.get_nowait()
+            resolving = entry.get('resolving')
+            if resolving:
+                resolving.cancel()
+                if resolving.done() and not resolving.cancelled():
+                    # Mark a failed lookahead as retrieved
+                    resolving.exception()
+        self._discard_upcoming()
+
+    async def destroy(self):
+        """Stop playback and remove this player"""
+        self.closed = True
+        players.pop(self.guild.id, None)
+        self.clear()
+        if self.current:
+            source = self.current[1]
+            self.current = None
+            await self.release(source)
+        # Backstop for processes whose source was dropped without cleanup
+        ffmpeg_supervisor.kill_guild(self.guild.id)
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
@@ -0,0 +1,169 @@
+import asyncio
+import random
+import time
+from config.config import (
+    EXTRACTION_RATE, EXTRACTION_BURST, EXTRACTION_MAX_CONCURRENCY,
+    EXTRACTION_BREAKER_THRESHOLD, EXTRACTION_BREAKER_RESET
+)
+
+# Error classes returned by classify_error()
+THROTTLED = 'throttled'
+AUTH = 'auth'
+TRANSIENT = 'transient'
+NOT_FOUND = 'not_found'
+PERMANENT = 'permanent'
+
+RETRYABLE = (THROTTLED, AUTH, TRANSIENT)
+
+ERROR_PATTERNS = (
+    (THROTTLED, ('429', 'too many requests', 'not a bot', 'rate limit', 'rate-limit')),
+    (AUTH, ('sign in', 'cookie', 'login required', '403')),
+    (NOT_FOUND, ('video unavailable', 'private video', 'has been removed', 'not available', '404', 'no video results')),
+    (TRANSIENT, ('timed out', 'timeout', 'connection', 'temporarily', 'reset by peer', '500', '502', '503', '504',
+                 'unable to download webpage', 'incomplete', 'worker crashed')),
+)
+
+class ExtractionUnavailable(Exception):
+    """Raised instead of calling YouTube while the circuit is open"""
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"يوتيوب غير متاح حالياً، حاول مرة أخرى بعد {max(1, int(retry_in))} ثانية")
+
+def classify_error(error):
+    """Sort an extraction error into one of the error classes"""
+    message = str(error).lower()
+    for kind, patterns in ERROR_PATTERNS:
+        if any(pattern in message for pattern in patterns):
+            return kind
+    return PERMANENT
+
+def retry_delay(attempt, base=0.5, cap=8.0):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class AdaptiveLimiter:
+    """Token bucket with an AIMD concurrency limit.
+
+    Each success raises the limit by roughly one per full window of
+    requests; each throttling error halves it.
+    """
+
+    def __init__(self, rate=EXTRACTION_RATE, burst=EXTRACTION_BURST, max_limit=EXTRACTION_MAX_CONCURRENCY, min_limit=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.throttled = 0
+        self.condition = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait for a token and a free concurrency slot"""
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            while True:
+                self._refill()
+                if self.in_flight < int(self.limit):
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    timeout = (1 - self.tokens) / self.rate
+                else:
+                    timeout = None
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, throttled=False, completed=True):
+        """Give the slot back and adapt the limit to the outcome.
+
+        A request that never completed (e.g. cancelled) leaves the limit as is.
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+            elif completed:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def stats(self):
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'tokens': round(self.tokens, 2),
+            'throttled': self.throttled
+        }
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, then lets one probe through"""
+
+    def __init__(self, threshold=EXTRACTION_BREAKER_THRESHOLD, reset_timeout=EXTRACTION_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.probe_started = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def check(self):
+        """Raise ExtractionUnavailable unless a request may go upstream"""
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        elapsed = now - self.opened_at
+        # A probe that never reported back (e.g. cancelled) is replaced after a while
+        probe_lost = self.probing and now - self.probe_started >= self.reset_timeout
+        if elapsed >= self.reset_timeout and (not self.probing or probe_lost):
+            # Half open: this request is the probe
+            self.probing = True
+            self.probe_started = now
+            return
+        self.rejected += 1
+        raise ExtractionUnavailable(max(0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print("YouTube extraction recovered, closing circuit")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+            print(f"YouTube extraction failing ({self.failures} in a row), opening circuit for {self.reset_timeout}s")
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'rejected': self.rejected
+        }
+
+extraction_limiter = AdaptiveLimiter()
+extraction_breaker = CircuitBreaker()
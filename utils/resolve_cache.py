@@ -0,0 +1,169 @@
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from config.config import (
+    RESOLVE_CACHE_SIZE, RESOLVE_CACHE_TTL, RESOLVE_CACHE_EXPIRY_MARGIN, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+)
+
+YOUTUBE_ID_REGEX = r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/)|youtu\.be/)([a-zA-Z0-9_-]{11})'
+
+def make_key(query):
+    """Normalize a URL or search query into a cache key"""
+    video_match = re.search(YOUTUBE_ID_REGEX, query)
+    if video_match:
+        return f"id:{video_match.group(1)}"
+
+    if query.startswith('ytsearch:'):
+        query = query[len('ytsearch:'):]
+    return "q:" + " ".join(query.lower().split())
+
+def get_expiry(data, now=None):
+    """Get the time a resolved entry stops being usable"""
+    now = now or time.time()
+    try:
+        expire = parse_qs(urlparse(data['url']).query).get('expire')
+        if not expire:
+            # Some googlevideo URLs carry parameters in the path instead
+            match = re.search(r'/expire/(\d+)', data['url'])
+            expire = [match.group(1)] if match else None
+        if expire:
+            return int(expire[0]) - RESOLVE_CACHE_EXPIRY_MARGIN
+    except (KeyError, TypeError, ValueError):
+        pass
+    return now + RESOLVE_CACHE_TTL
+
+class ResolutionCache:
+    """LRU cache of extracted video info that expires with the stream URL.
+
+    Each entry is found by its video ID and by every query that resolved
+    to it; max_size counts entries, not keys.
+    """
+
+    def __init__(self, max_size=RESOLVE_CACHE_SIZE):
+        self.max_size = max_size
+        # entry key -> (expires_at, data, keys pointing at it), least recently used first
+        self.entries = OrderedDict()
+        # query or video key -> entry key
+        self.aliases = {}
+        # Called with (query, data) for every local put, e.g. to share it
+        # with the other processes of a cluster
+        self.on_put = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """Get cached info for a query, or None if missing or expired"""
+        entry_key = self.aliases.get(make_key(query))
+        cached = self.entries.get(entry_key)
+        if cached is not None:
+            expires_at, data, _ = cached
+            if expires_at > time.time():
+                self.entries.move_to_end(entry_key)
+                self.hits += 1
+                # Callers annotate the info they get; keep the cached entry clean
+                return dict(data)
+            self._remove(entry_key)
+
+        self.misses += 1
+        return None
+
+    def _remove(self, entry_key):
+        _, _, keys = self.entries.pop(entry_key)
+        for key in keys:
+            del self.aliases[key]
+
+    def put(self, query, data, notify=True):
+        """Cache info under the query and under the resolved video ID"""
+        if self.max_size <= 0 or not data.get('url'):
+            return
+
+        expires_at = get_expiry(data)
+        if expires_at <= time.time():
+            return
+
+        # The caller goes on to use data; store a copy it cannot change
+        data = dict(data)
+        query_key = make_key(query)
+        entry_key = query_key
+        if data.get('id') and data.get('extractor_key', 'Youtube') == 'Youtube':
+            entry_key = f"id:{data['id']}"
+        keys = {query_key, entry_key}
+        if entry_key in self.entries:
+            # Keep the other queries already known to lead to this video
+            keys |= self.entries[entry_key][2]
+        self.entries[entry_key] = (expires_at, data, keys)
+        self.entries.move_to_end(entry_key)
+        for key in keys:
+            previous = self.aliases.get(key)
+            if previous != entry_key and previous in self.entries:
+                # The query now leads to another video
+                self.entries[previous][2].discard(key)
+            self.aliases[key] = entry_key
+
+        while len(self.entries) > self.max_size:
+            self._remove(next(iter(self.entries)))
+
+        if notify and self.on_put:
+            self.on_put(query, data)
+
+    def stats(self):
+        """Get hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+class SearchCache:
+    """LRU cache of flat search results, so a repeated query skips YouTube search.
+
+    Candidates carry no stream URL, so they are kept for SEARCH_CACHE_TTL
+    seconds rather than until a URL expires.
+    """
+
+    def __init__(self, max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """Get cached candidates for a query, or None if missing or expired"""
+        key = make_key(query)
+        cached = self.entries.get(key)
+        if cached is not None:
+            expires_at, candidates = cached
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                # Callers annotate the candidates they pick
+                return [dict(candidate) for candidate in candidates]
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, query, candidates):
+        if self.max_size <= 0 or not candidates:
+            return
+        key = make_key(query)
+        self.entries[key] = (time.time() + self.ttl, [dict(candidate) for candidate in candidates])
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+resolution_cache = ResolutionCache()
+search_cache = SearchCache()
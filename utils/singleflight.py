@@ -0,0 +1,54 @@
+import asyncio
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight call.
+
+    The first caller for a key starts the work; callers arriving while it
+    runs await the same result. A caller being cancelled does not cancel
+    the shared work for the others, but once every caller is gone the
+    work is cancelled too.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        # task -> number of callers waiting on it
+        self.waiters = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        """Run func() for key, or join the call already running for it"""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+                if not task.done():
+                    # Last caller was cancelled; nobody wants the result
+                    task.cancel()
+
+    def _forget(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every caller went away
+            task.exception()
+
+    def stats(self):
+        """Get started and coalesced call counters"""
+        return {
+            'in_flight': len(self.calls),
+            'started': self.started,
+            'coalesced': self.coalesced
+        }
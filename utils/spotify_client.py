@@ -0,0 +1,116 @@
+import asyncio
+import time
+import aiohttp
+from config.config import SPOTIFY_API_URL, SPOTIFY_TOKEN_URL, SPOTIFY_MAX_CONNECTIONS, SPOTIFY_MAX_RETRIES
+
+class SpotifyError(Exception):
+    """Raised when the Spotify Web API returns an error"""
+
+    def __init__(self, http_status, msg):
+        self.http_status = http_status
+        self.msg = msg
+        super().__init__(f"http status: {http_status} - {msg}")
+
+class AsyncSpotify:
+    """Non-blocking Spotify Web API client using client credentials.
+
+    Requests share one pooled keep-alive session. Responses are the same
+    JSON dicts spotipy returns, so callers can switch over unchanged.
+    """
+
+    def __init__(self, client_id, client_secret, *, api_url=SPOTIFY_API_URL, token_url=SPOTIFY_TOKEN_URL,
+                 max_connections=SPOTIFY_MAX_CONNECTIONS, max_retries=SPOTIFY_MAX_RETRIES, retry_backoff=0.5):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url.rstrip('/')
+        self.token_url = token_url
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        # Seconds before the first retry of a server error, doubled on each one after
+        self.retry_backoff = retry_backoff
+        self.session = None
+        self.token = None
+        self.token_expires_at = 0
+        self.token_lock = None
+
+    def _get_session(self):
+        # Created lazily so it binds to the running event loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=15))
+            self.token_lock = asyncio.Lock()
+        return self.session
+
+    async def close(self):
+        """Close the pooled session"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def _get_token(self):
+        session = self._get_session()
+        async with self.token_lock:
+            if self.token and self.token_expires_at - 60 > time.time():
+                return self.token
+
+            async with session.post(
+                self.token_url,
+                data={'grant_type': 'client_credentials'},
+                auth=aiohttp.BasicAuth(self.client_id, self.client_secret)
+            ) as response:
+                payload = await response.json(content_type=None)
+                if response.status != 200:
+                    raise SpotifyError(response.status, payload.get('error_description') or payload.get('error') or 'token request failed')
+
+            self.token = payload['access_token']
+            self.token_expires_at = time.time() + payload.get('expires_in', 3600)
+            return self.token
+
+    async def _get(self, url, params=None):
+        if not url.startswith('http'):
+            url = f"{self.api_url}/{url}"
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            token = await self._get_token()
+            async with session.get(url, params=params, headers={'Authorization': f'Bearer {token}'}) as response:
+                if response.status == 429 and attempt < self.max_retries:
+                    retry_after = float(response.headers.get('Retry-After', '1'))
+                    print(f"Spotify rate limited, retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                if response.status == 401 and attempt < self.max_retries:
+                    # Token revoked or expired early
+                    self.token = None
+                    continue
+                if response.status >= 500 and attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+
+                payload = await response.json(content_type=None)
+                if response.status >= 400:
+                    error = payload.get('error') if isinstance(payload, dict) else None
+                    msg = error.get('message') if isinstance(error, dict) else str(error or 'request failed')
+                    raise SpotifyError(response.status, msg)
+                return payload
+
+    async def track(self, track_id):
+        """Get a single track"""
+        return await self._get(f"tracks/{track_id}")
+
+    async def playlist(self, playlist_id, fields=None):
+        """Get a playlist, optionally trimmed with a fields filter"""
+        params = {'fields': fields} if fields else None
+        return await self._get(f"playlists/{playlist_id}", params)
+
+    async def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0):
+        """Get one page of a playlist's tracks"""
+        params = {'limit': limit, 'offset': offset}
+        if fields:
+            params['fields'] = fields
+        return await self._get(f"playlists/{playlist_id}/tracks", params)
+
+    async def next(self, result):
+        """Get the page after a paged result, or None"""
+        if result.get('next'):
+            return await self._get(result['next'])
+        return None
@@ -1,27 +1,49 @@
 import re
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-from config.config import SPOTIFY_PATTERNS
+import asyncio
+from collections import deque
+from itertools import islice
+from config.config import SPOTIFY_PATTERNS, SPOTIFY_PAGE_CONCURRENCY
+from utils.spotify_client import AsyncSpotify, SpotifyError
+from utils.singleflight import SingleFlight
+
+# Only the track fields format_track() reads
+TRACK_FIELDS = "id,name,duration_ms,artists(name),album(name,images(url))"
+PAGE_SIZE = 100
+
+def format_track(track):
+    """Turn a Spotify track object into the dict the bot queues"""
+    artists = ", ".join([artist['name'] for artist in track['artists']])
+    return {
+        'spotify_id': track['id'],
+        'search_query': f"{artists} - {track['name']} official audio",
+        'track_name': track['name'],
+        'artists': artists,
+        'duration_ms': track['duration_ms'],
+        'album_name': track['album']['name'],
+        'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None
+    }
 
 class SpotifyHandler:
     def __init__(self, client_id=None, client_secret=None):
         self.sp = None
         self.client_id = client_id
         self.client_secret = client_secret
+        # Concurrent lookups of the same track share one API call
+        self.track_flight = SingleFlight()
         if client_id and client_secret:
             try:
-                self.sp = spotipy.Spotify(
-                    client_credentials_manager=SpotifyClientCredentials(
-                        client_id=client_id,
-                        client_secret=client_secret
-                    )
-                )
+                self.sp = AsyncSpotify(client_id, client_secret)
                 print("Spotify client initialized successfully")
             except Exception as e:
                 print(f"Error initializing Spotify client: {str(e)}")
         else:
             print("No Spotify credentials provided")
 
+    async def close(self):
+        """Close the Spotify client's HTTP session"""
+        if self.sp:
+            await self.sp.close()
+
     async def get_track_info(self, url):
         """Get track information from Spotify URL"""
         if not self.sp:
@@ -44,13 +66,13 @@ class SpotifyHandler:
             print(f"Attempting to get track info for ID: {track_id}")
             
             try:
-                track_info = self.sp.track(track_id)
+                track_info = await self.track_flight.do(track_id, lambda: self.sp.track(track_id))
                 print("Successfully retrieved track info from Spotify")
-            except spotipy.exceptions.SpotifyException as e:
+            except SpotifyError as e:
                 print(f"Spotify API error: {str(e)}")
-                if "not found" in str(e).lower():
+                if e.http_status == 404 or "not found" in str(e).lower():
                     return None, "❌ لم يتم العثور على المقطع. قد يكون غير متاح في منطقتك أو تم إزالته"
-                elif "forbidden" in str(e).lower():
+                elif e.http_status == 403 or "forbidden" in str(e).lower():
                     return None, "❌ لا يمكن الوصول إلى المقطع. تأكد من أنه متاح في منطقتك"
                 return None, f"❌ حدث خطأ في Spotify: {str(e)}"
             
@@ -59,73 +81,76 @@ class SpotifyHandler:
                 return None, "❌ هذا المقطع غير متاح للتشغيل في منطقتك"
             
             # Format artist and track name for YouTube search
-            artists = ", ".join([artist['name'] for artist in track_info['artists']])
-            track_name = track_info['name']
-            search_query = f"{artists} - {track_name} official audio"
+            track = format_track(track_info)
+            print(f"Generated search query: {track['search_query']}")
             
-            print(f"Generated search query: {search_query}")
-            
-            return {
-                'search_query': search_query,
-                'track_name': track_name,
-                'artists': artists,
-                'duration_ms': track_info['duration_ms'],
-                'album_name': track_info['album']['name'],
-                'album_art': track_info['album']['images'][0]['url'] if track_info['album']['images'] else None
-            }, None
+            return track, None
             
         except Exception as e:
             print(f"Unexpected error getting Spotify track info: {str(e)}")
             return None, f"❌ حدث خطأ غير متوقع: {str(e)}"
 
     async def get_playlist_tracks(self, url):
-        """Get all tracks from a Spotify playlist"""
+        """Stream tracks from a Spotify playlist as its pages arrive.
+
+        Each yielded track also carries 'playlist_name' and 'playlist_total'.
+        Yields nothing if the playlist cannot be loaded.
+        """
         if not self.sp:
             print("Spotify client not initialized")
-            return None
+            return
             
+        pending = deque()
         try:
             # Extract playlist ID from URL
             playlist_match = re.match(SPOTIFY_PATTERNS['playlist'], url)
             if not playlist_match:
                 print("Invalid Spotify playlist URL")
-                return None
+                return
                 
             playlist_id = playlist_match.group(1)
             print(f"Getting playlist info for ID: {playlist_id}")
             
-            # Get playlist info
-            playlist_info = self.sp.playlist(playlist_id)
+            # The playlist object embeds the first page of tracks and the total
+            playlist_info = await self.sp.playlist(
+                playlist_id,
+                fields=f"name,tracks(total,items(track({TRACK_FIELDS})))"
+            )
             playlist_name = playlist_info['name']
-            
-            # Get all tracks
-            tracks = []
-            results = self.sp.playlist_tracks(playlist_id)
-            
-            while results:
-                for item in results['items']:
+            first_page = playlist_info['tracks']
+            total = first_page['total']
+            print(f"Streaming {total} tracks from playlist: {playlist_name}")
+
+            def fetch_page(offset):
+                return asyncio.ensure_future(self.sp.playlist_tracks(
+                    playlist_id,
+                    fields=f"items(track({TRACK_FIELDS}))",
+                    limit=PAGE_SIZE,
+                    offset=offset
+                ))
+
+            # Keep a bounded window of later pages in flight, in offset order
+            offsets = iter(range(len(first_page['items']), total, PAGE_SIZE))
+            for offset in islice(offsets, SPOTIFY_PAGE_CONCURRENCY):
+                pending.append(fetch_page(offset))
+
+            page = first_page
+            while True:
+                for item in page['items']:
                     if item['track']:
-                        track = item['track']
-                        artists = ", ".join([artist['name'] for artist in track['artists']])
-                        tracks.append({
-                            'search_query': f"{artists} - {track['name']} official audio",
-                            'track_name': track['name'],
-                            'artists': artists,
-                            'duration_ms': track['duration_ms'],
-                            'album_name': track['album']['name'],
-                            'album_art': track['album']['images'][0]['url'] if track['album']['images'] else None
-                        })
-                
-                if results['next']:
-                    results = self.sp.next(results)
-                else:
+                        track = format_track(item['track'])
+                        track['playlist_name'] = playlist_name
+                        track['playlist_total'] = total
+                        yield track
+
+                if not pending:
                     break
-                    
-            print(f"Found {len(tracks)} tracks in playlist: {playlist_name}")
-            return {
-                'name': playlist_name,
-                'tracks': tracks
-            }
+                page = await pending.popleft()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(fetch_page(offset))
         except Exception as e:
             print(f"Error getting Spotify playlist: {str(e)}")
-            return None 
\ No newline at end of file
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import threading
+import time
+from config.config import TRACK_INDEX_PATH
+
+class TrackIndex:
+    """On-disk map from Spotify track IDs to the YouTube videos chosen for them.
+
+    Uses SQLite in WAL mode so several bot processes on one host can read
+    while another writes.
+    """
+
+    def __init__(self, path=TRACK_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS spotify_tracks (
+                    spotify_id TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    duration INTEGER,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def get(self, spotify_id):
+        """Get the indexed video for a Spotify track, or None"""
+        with self.lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT video_id, duration FROM spotify_tracks WHERE spotify_id = ?",
+                    (spotify_id,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading track index: {str(e)}")
+                return None
+
+        if not row:
+            return None
+        return {'video_id': row[0], 'duration': row[1]}
+
+    def put(self, spotify_id, video_id, duration=None):
+        """Remember the video chosen for a Spotify track"""
+        with self.lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO spotify_tracks (spotify_id, video_id, duration, updated_at) VALUES (?, ?, ?, ?)",
+                    (spotify_id, video_id, int(duration) if duration else None, time.time())
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing track index: {str(e)}")
+
+    def delete(self, spotify_id):
+        """Forget a Spotify track's video, e.g. once it has been removed"""
+        with self.lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM spotify_tracks WHERE spotify_id = ?", (spotify_id,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing track index: {str(e)}")
+
+    async def lookup(self, spotify_id, *, loop):
+        """Non-blocking get()"""
+        return await loop.run_in_executor(None, self.get, spotify_id)
+
+    async def store(self, spotify_id, video_id, duration=None, *, loop):
+        """Non-blocking put()"""
+        await loop.run_in_executor(None, self.put, spotify_id, video_id, duration)
+
+    async def forget(self, spotify_id, *, loop):
+        """Non-blocking delete()"""
+        await loop.run_in_executor(None, self.delete, spotify_id)
+
+track_index = TrackIndex()
@@ -1,13 +1,72 @@
 import discord
-import yt_dlp
 import asyncio
-import ssl
-from config.config import YTDL_OPTIONS, FFMPEG_OPTIONS, BROWSER_PATHS, CURRENT_OS
-import os
+from config.config import (
+    YTDL_OPTIONS, FFMPEG_OPTIONS,
+    PLAYBACK_MODE, PLAYBACK_VOLUME, OPUS_FORMAT, OPUS_BITRATE, EXTRACTION_RETRIES, YTDL_SEARCH_RESULTS,
+    HEDGE_ENABLED, HEDGE_BACKEND, AUDIO_BUFFER_MAX_SECONDS, DSP_BATCH_FRAMES
+)
+from utils.resolve_cache import resolution_cache, search_cache, make_key
+from utils.singleflight import SingleFlight
+from utils.hedging import Hedger, note_upstream
+from utils.rate_limit import (
+    extraction_limiter, extraction_breaker, classify_error, retry_delay,
+    RETRYABLE, THROTTLED, TRANSIENT, AUTH
+)
+from utils.extraction_pool import extraction_pool, ExtractionTimeout
+from utils.audio_cache import audio_cache
+from utils.ffmpeg_supervisor import SupervisedFFmpeg
+from utils.audio_buffer import BufferedAudioSource, FRAME_SIZE
+from utils.dsp import FilterChain, DSP_AVAILABLE
+from utils.cookie_manager import cookie_manager
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
+# In-flight extractions shared between concurrent requests
+extraction_flight = SingleFlight()
+# Races slow YouTube resolves against HEDGE_BACKEND when HEDGE_ENABLED is set,
+# as long as an extraction worker is free to run the hedge
+search_hedge = Hedger('youtube', HEDGE_BACKEND, can_hedge=lambda: extraction_pool.has_idle_worker())
+
+def is_search(query):
+    """Whether a query is search text rather than a YouTube link"""
+    return not ('youtube.com' in query or 'youtu.be' in query)
+
+def watch_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def make_candidate(entry):
+    """Keep the fields of a flat search result the resolver needs"""
+    return {
+        'id': entry['id'],
+        'title': entry.get('title'),
+        'duration': entry.get('duration'),
+        'channel': entry.get('channel') or entry.get('uploader'),
+        'url': watch_url(entry['id'])
+    }
+
+def is_opus(data):
+    """Whether extracted info points at an Opus audio stream"""
+    return data.get('acodec') == 'opus' and data.get('ext') in ('webm', 'ogg', 'opus')
+
+def create_source(data, filename=None, volume=PLAYBACK_VOLUME, guild_id=None, preset=None, gain=1.0):
+    """Build the cheapest playable source for extracted info.
+
+    gain is the track's loudness correction, applied on top of volume.
+    This spawns ffmpeg, so callers hold an ffmpeg_supervisor.slot() around it.
+    """
+    if filename is None:
+        # Play popular tracks from disk; otherwise stream and cache in the background
+        filename = audio_cache.get(data.get('id'), data.get('format_id'))
+        if filename is None:
+            audio_cache.schedule_fill(data)
+
+    # Effects work on PCM, so a guild with an EQ preset skips the Opus path
+    if PLAYBACK_MODE == 'opus' and is_opus(data) and not preset:
+        return YTDLOpusSource.from_data(data, filename, volume=volume * gain, guild_id=guild_id)
+    return YTDLSource.from_data(data, filename, volume=volume, guild_id=guild_id, preset=preset, gain=gain)
+
+class TrackData:
+    """Track metadata shared by the PCM and Opus sources"""
+
+    def set_data(self, data):
         self.data = data
         self.title = data.get('title')
         self.url = data.get('url')
@@ -15,68 +74,271 @@ class YTDLSource(discord.PCMVolumeTransformer):
         self.thumbnail = data.get('thumbnail')
         self.webpage_url = data.get('webpage_url')
 
+class SupervisedPCMAudio(SupervisedFFmpeg, discord.FFmpegPCMAudio):
+    """FFmpegPCMAudio whose process is tracked by the supervisor"""
+
+    def __init__(self, source, *, guild_id=None, **kwargs):
+        self.guild_id = guild_id
+        super().__init__(source, **kwargs)
+
+class YTDLOpusSource(TrackData, SupervisedFFmpeg, discord.FFmpegOpusAudio):
+    """Opus source that skips PCM decoding, Python volume scaling and re-encoding.
+
+    At unity volume the stream is copied as is. Any other volume is applied
+    by an ffmpeg filter, and ffmpeg encodes the Opus, never Python.
+    """
+
+    def __init__(self, source, *, data, volume=PLAYBACK_VOLUME, before_options=None, guild_id=None, flush=False):
+        self.set_data(data)
+        self.volume = volume
+        self.guild_id = guild_id
+        options = '-vn'
+        if flush:
+            # One Ogg page per packet rather than per second, so readers never wait out a page
+            options += ' -page_duration 20000'
+        # FFmpegOpusAudio stream-copies when told the input codec is opus
+        # and encodes with libopus for anything else
+        if volume == 1.0 and is_opus(data):
+            super().__init__(source, codec='opus', before_options=before_options, options=options)
+        else:
+            super().__init__(source, codec=None, bitrate=OPUS_BITRATE, before_options=before_options,
+                             options=f'{options} -af volume={volume}')
+
+    @classmethod
+    def from_data(cls, data, filename=None, *, volume=PLAYBACK_VOLUME, guild_id=None, flush=False):
+        """Build an Opus source from already extracted info"""
+        before_options = None if filename else FFMPEG_OPTIONS['before_options']
+        return cls(filename or data['url'], data=data, volume=volume, before_options=before_options,
+                   guild_id=guild_id, flush=flush)
+
+class YTDLSource(TrackData, discord.PCMVolumeTransformer):
+    """PCM source with volume and, when NumPy is installed, EQ presets and volume ramps.
+
+    While no preset is set and the volume is steady, frames go straight
+    through PCMVolumeTransformer. Otherwise batches of up to
+    DSP_BATCH_FRAMES frames are pulled from the read-ahead buffer, run
+    through the filter chain and handed out one frame at a time.
+
+    gain, the track's loudness correction, scales every volume it is given.
+    """
+
+    def __init__(self, source, *, data, volume=PLAYBACK_VOLUME, preset=None, gain=1.0):
+        self.gain = gain
+        volume = volume * gain
+        super().__init__(source, volume)
+        self.set_data(data)
+        self.chain = FilterChain(volume, preset) if DSP_AVAILABLE else None
+        # Filtered frames not yet handed to the player
+        self.filtered = b''
+        self.offset = 0
+
+    def read(self):
+        if self.offset < len(self.filtered):
+            frame = self.filtered[self.offset:self.offset + FRAME_SIZE]
+            self.offset += FRAME_SIZE
+            return frame
+        chain = self.chain
+        if chain is None or not chain.active:
+            return super().read()
+
+        read_frames = getattr(self.original, 'read_frames', None)
+        pcm = read_frames(DSP_BATCH_FRAMES) if read_frames else self.original.read()
+        if len(pcm) < FRAME_SIZE:
+            return b''
+        self.filtered = chain.process(pcm)
+        self.offset = FRAME_SIZE
+        if not chain.active:
+            # Ramp finished; the plain path carries on at the new volume
+            self.volume = chain.volume.gain
+        return self.filtered[:FRAME_SIZE]
+
+    def _sync_chain(self):
+        """Hand the current volume to the chain before it takes over"""
+        if not self.chain.active:
+            self.chain.volume.gain = self.chain.volume.target = self.volume
+
+    def set_volume(self, volume):
+        """Change volume, ramping when NumPy is available"""
+        volume = volume * self.gain
+        if not self.chain:
+            self.volume = volume
+            return
+        self._sync_chain()
+        self.chain.set_volume(volume)
+
+    def set_preset(self, preset):
+        """Switch EQ preset mid-track; returns False without NumPy"""
+        if not self.chain:
+            return False
+        self._sync_chain()
+        self.chain.set_preset(preset)
+        if not self.chain.active:
+            self.volume = self.chain.volume.gain
+        return True
+
+    @classmethod
+    def from_data(cls, data, filename=None, *, volume=PLAYBACK_VOLUME, guild_id=None, preset=None, gain=1.0):
+        """Build a PCM source from already extracted info"""
+        # Reconnect options only apply to network streams
+        before_options = None if filename else FFMPEG_OPTIONS['before_options']
+        source = SupervisedPCMAudio(filename or data['url'], guild_id=guild_id,
+                                    before_options=before_options, options=FFMPEG_OPTIONS['options'])
+        if AUDIO_BUFFER_MAX_SECONDS > 0:
+            # Read ahead so a slow network read does not stall the voice send loop
+            source = BufferedAudioSource(source)
+        return cls(source, data=data, volume=volume, preset=preset, gain=gain)
+
     @classmethod
-    async def get_browser_cookie_path(cls):
-        """Get the path to browser cookies based on OS"""
-        if CURRENT_OS not in BROWSER_PATHS:
-            print(f"Unsupported OS: {CURRENT_OS}")
-            return None
-        
-        paths = BROWSER_PATHS[CURRENT_OS]
-        for browser, path in paths.items():
-            if os.path.exists(path):
-                print(f"Found {browser} at {path}")
-                return browser, path
-        
-        return None
+    async def get_data(cls, url, *, loop=None, stream=False, guild_id=None):
+        """Resolve a URL (or, to download, a search query) to (info, filename) without spawning FFmpeg.
+
+        Searches to stream go through search() first, which names the video.
+        """
+        # Reuse info extracted recently for the same video
+        if stream:
+            data = resolution_cache.get(url)
+            if data:
+                print("Using cached video info")
+                return data, None
+
+            # Guilds asking for the same track at once share one extraction
+            note_upstream()
+            return await extraction_flight.do(
+                make_key(url),
+                lambda: cls._resolve(url, guild_id=guild_id)
+            )
+
+        if is_search(url):
+            url = f"ytsearch:{url}"
+        return await cls._extract(url, await cls.build_options(), download=True, guild_id=guild_id)
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
-        loop = loop or asyncio.get_event_loop()
-        
-        # Get browser and cookie path
-        browser_info = await cls.get_browser_cookie_path()
-        if browser_info:
-            browser, path = browser_info
-            print(f"Using {browser} cookies from {path}")
-            YTDL_OPTIONS['cookies-from-browser'] = f"{browser}:{path}"
-        
-        try:
-            # Create a copy of options and add SSL context
-            ytdl_opts = dict(YTDL_OPTIONS)
-            
-            # Create SSL context that ignores certificate verification
-            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS)
-            ssl_context.verify_mode = ssl.CERT_NONE
-            ssl_context.check_hostname = False
-            
-            # Add SSL context to options
-            ytdl_opts['http_headers'] = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            with yt_dlp.YoutubeDL(ytdl_opts) as ytdl:
-                # Check if URL is a search query
-                if not ('youtube.com' in url or 'youtu.be' in url):
-                    print("Searching YouTube...")
-                    url = f"ytsearch:{url}"
-
-                # Extract video info
+    async def resolve_search(cls, query, primary, *, guild_id=None, hedge=True):
+        """Resolve a search query to stream info with primary().
+
+        In hedged mode the same query is sent to HEDGE_BACKEND when primary()
+        is slower than usual, and whichever answers first is played. Pass
+        hedge=False for resolves nobody is waiting on, such as lookahead.
+        """
+        if not HEDGE_ENABLED or not hedge:
+            return await primary()
+
+        async def secondary():
+            note_upstream()
+            return await extraction_flight.do(
+                f"{HEDGE_BACKEND}:{make_key(query)}",
+                lambda: cls._search_secondary(query, guild_id=guild_id)
+            )
+
+        data, backend = await search_hedge.run(primary, secondary)
+        if backend != 'youtube':
+            print(f"Using {backend} result for {query}")
+        return data
+
+    @classmethod
+    async def _search_secondary(cls, query, *, guild_id):
+        # The limiter and circuit breaker track YouTube only; hedges are
+        # bounded by the idle worker check instead
+        data, _ = await cls._extract(f"{HEDGE_BACKEND}1:{query}", await cls.build_options(),
+                                     download=False, guild_id=guild_id, limiter=None, breaker=None)
+        return data
+
+    @classmethod
+    async def search(cls, query, *, loop=None, guild_id=None, limit=YTDL_SEARCH_RESULTS):
+        """Search YouTube without extracting formats and return candidate videos"""
+        candidates = search_cache.get(query)
+        if candidates is not None:
+            print("Using cached search results")
+            return candidates
+        note_upstream()
+        candidates = await extraction_flight.do(
+            f"search:{make_key(query)}",
+            lambda: cls._search(query, guild_id=guild_id, limit=limit)
+        )
+        search_cache.put(query, candidates)
+        # Each caller gets its own copies, like cache hits
+        return [dict(candidate) for candidate in candidates]
+
+    @classmethod
+    async def _search(cls, query, *, guild_id, limit):
+        ytdl_opts = await cls.build_options()
+        # IDs, titles and durations come straight from the results page
+        ytdl_opts['extract_flat'] = 'in_playlist'
+        print("Searching YouTube...")
+        data, _ = await cls._extract(f"ytsearch{limit}:{query}", ytdl_opts, download=False, guild_id=guild_id)
+        return [make_candidate(entry) for entry in data.get('entries') or [] if entry and entry.get('id')]
+
+    @classmethod
+    async def _resolve(cls, url, *, guild_id):
+        """Extract stream info for a link and cache it"""
+        data, filename = await cls._extract(url, await cls.build_options(), download=False, guild_id=guild_id)
+        resolution_cache.put(url, data)
+        return data, filename
+
+    @classmethod
+    async def build_options(cls):
+        """YoutubeDL options for extraction, including the exported cookies"""
+        # Workers keep a YoutubeDL per distinct set of options, so these
+        # must stay the same from call to call
+        ytdl_opts = dict(YTDL_OPTIONS)
+        if PLAYBACK_MODE == 'opus':
+            ytdl_opts['format'] = OPUS_FORMAT
+
+        # Exported once and reused; never written into the shared YTDL_OPTIONS
+        cookiefile = await cookie_manager.get_cookiefile()
+        if cookiefile:
+            ytdl_opts['cookiefile'] = cookiefile
+
+        ytdl_opts['http_headers'] = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        return ytdl_opts
+
+    @classmethod
+    async def _extract(cls, url, ytdl_opts, *, download, guild_id,
+                       limiter=extraction_limiter, breaker=extraction_breaker):
+        """Run yt-dlp in a worker with rate limiting and bounded retries"""
+        attempt = 0
+        while True:
+            # Fail fast while YouTube is unhealthy instead of adding to the storm
+            if breaker:
+                breaker.check()
+            if limiter:
+                await limiter.acquire()
+            kind = None
+            # Whether YouTube answered; a cancelled or timed out job tells the limiter nothing
+            completed = False
+            try:
+                # Extract video info in a worker process
                 print("Extracting video info...")
-                data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
-                
-                if 'entries' in data:
-                    data = data['entries'][0]
+                data, filename = await extraction_pool.extract(url, ytdl_opts, download=download, guild_id=guild_id)
+                completed = True
+            except Exception as e:
+                kind = classify_error(e)
+                completed = not isinstance(e, ExtractionTimeout)
+                print(f"Error in YTDLSource.from_url ({kind}): {str(e)}")
+                if breaker and kind in (THROTTLED, TRANSIENT):
+                    breaker.record_failure()
+                elif breaker:
+                    # YouTube answered; the request itself was bad
+                    breaker.record_success()
 
-                filename = data['url'] if stream else ytdl.prepare_filename(data)
+                attempt += 1
+                # A stage timeout already used the whole deadline; retrying would multiply it
+                if kind not in RETRYABLE or attempt > EXTRACTION_RETRIES or isinstance(e, ExtractionTimeout):
+                    raise
+                if kind == AUTH and 'cookiefile' in ytdl_opts:
+                    # Try without cookies if they are the problem, and re-export them
+                    print("Retrying without cookies...")
+                    ytdl_opts.pop('cookiefile', None)
+                    cookie_manager.invalidate()
+            else:
+                if breaker:
+                    breaker.record_success()
                 print("Successfully extracted info")
-                return cls(discord.FFmpegPCMAudio(filename, **FFMPEG_OPTIONS), data=data)
-                
-        except Exception as e:
-            print(f"Error in YTDLSource.from_url: {str(e)}")
-            # Try without cookies if failed
-            if 'cookies-from-browser' in ytdl_opts:
-                print("Retrying without cookies...")
-                ytdl_opts.pop('cookies-from-browser', None)
-                return await cls.from_url(url, loop=loop, stream=stream)
-            raise e 
\ No newline at end of file
+                return data, filename
+            finally:
+                if limiter:
+                    await limiter.release(throttled=kind == THROTTLED, completed=completed)
+
+            await asyncio.sleep(retry_delay(attempt))
@@ -0,0 +1,91 @@
+import json
+import time
+import yt_dlp
+from config.config import YTDL_MAX_USES, YTDL_MAX_ERRORS, YTDL_MAX_AGE, YTDL_MAX_IDLE
+
+def options_key(options):
+    """Stable key for a set of YoutubeDL options"""
+    return json.dumps(options, sort_keys=True, default=str)
+
+class PooledYoutubeDL:
+    """A YoutubeDL instance and the health counters used to recycle it"""
+
+    def __init__(self, options, key):
+        self.ytdl = yt_dlp.YoutubeDL(options)
+        self.key = key
+        self.created = time.monotonic()
+        self.uses = 0
+        self.errors = 0
+
+    def is_healthy(self, max_uses, max_errors, max_age):
+        return (self.uses < max_uses
+                and self.errors < max_errors
+                and time.monotonic() - self.created < max_age)
+
+    def close(self):
+        try:
+            self.ytdl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL: {str(e)}")
+
+class YoutubeDLPool:
+    """Reusable YoutubeDL instances keyed by their options.
+
+    Building a YoutubeDL sets up the extractor registry and HTTP opener, and
+    its YouTube extractor keeps the deciphering code for the current player
+    in memory. Reusing instances means that work is done once per process
+    instead of once per song. Instances are retired after max_uses jobs,
+    max_errors consecutive failures or max_age seconds.
+    """
+
+    def __init__(self, max_uses=YTDL_MAX_USES, max_errors=YTDL_MAX_ERRORS,
+                 max_age=YTDL_MAX_AGE, max_idle=YTDL_MAX_IDLE):
+        self.max_uses = max_uses
+        self.max_errors = max_errors
+        self.max_age = max_age
+        self.max_idle = max(1, max_idle)
+        # Idle instances, least recently used first
+        self.idle = []
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def checkout(self, options):
+        """Take an idle instance built with these options, or build one"""
+        key = options_key(options)
+        for index, pooled in enumerate(self.idle):
+            if pooled.key == key:
+                del self.idle[index]
+                self.reused += 1
+                return pooled
+        self.created += 1
+        return PooledYoutubeDL(options, key)
+
+    def checkin(self, pooled, ok=True):
+        """Return an instance after a job, retiring it if it looks unhealthy"""
+        pooled.uses += 1
+        pooled.errors = 0 if ok else pooled.errors + 1
+
+        if not pooled.is_healthy(self.max_uses, self.max_errors, self.max_age):
+            print(f"Recycling YoutubeDL instance after {pooled.uses} uses ({pooled.errors} failing)")
+            self.recycled += 1
+            pooled.close()
+            return
+
+        self.idle.append(pooled)
+        # Options change when cookies are re-exported; drop the stale instances
+        while len(self.idle) > self.max_idle:
+            self.idle.pop(0).close()
+
+    def close(self):
+        for pooled in self.idle:
+            pooled.close()
+        self.idle = []
+
+    def stats(self):
+        return {
+            'idle': len(self.idle),
+            'created': self.created,
+            'reused': self.reused,
+            'recycled': self.recycled
+        }